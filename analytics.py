@@ -0,0 +1,117 @@
+import aiosqlite
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DB_PATH = "tutoria_analytics.db"
+QUESTION_QUEUE_SIZE = 10_000
+QUESTION_BATCH_SIZE = 100
+
+INSERT_QUESTION = '''
+    INSERT INTO student_questions
+    (timestamp, student_level, lesson_number, question, response, module, lesson_name)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# One connection for the process; opening SQLite per request re-reads the schema every time
+_db: Optional[aiosqlite.Connection] = None
+
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+
+
+async def get_analytics_db() -> aiosqlite.Connection:
+    """Return the shared analytics connection, opening it and creating the table on first use."""
+    global _db
+    if _db is None:
+        db = await aiosqlite.connect(ANALYTICS_DB_PATH)
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS student_questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                student_level TEXT,
+                lesson_number INTEGER,
+                question TEXT NOT NULL,
+                response TEXT NOT NULL,
+                module TEXT,
+                lesson_name TEXT
+            )
+        ''')
+        await db.commit()
+        _db = db
+    return _db
+
+
+async def close_analytics_db():
+    """Close the shared analytics connection."""
+    global _db
+    if _db is not None:
+        await _db.close()
+    _db = None
+
+
+def start_question_writer():
+    """Start the background task that saves queued student questions."""
+    global _queue, _worker
+    if _worker is None:
+        _queue = asyncio.Queue(maxsize=QUESTION_QUEUE_SIZE)
+        _worker = asyncio.create_task(_write_batches())
+
+
+def record_question(*values):
+    """Queue a student question to be inserted off the response path.
+
+    values are the student_questions columns after timestamp; the time is taken
+    here and only formatted by the writer.
+    """
+    start_question_writer()
+    try:
+        _queue.put_nowait((time.time(), *values))
+    except asyncio.QueueFull:
+        logger.warning("Question queue full, dropping analytics row")
+
+
+async def stop_question_writer():
+    """Save whatever is still queued and stop the writer."""
+    global _queue, _worker
+    if _worker is None:
+        return
+    await _queue.put(None)
+    await _worker
+    _queue = None
+    _worker = None
+
+
+async def _write_batches():
+    while True:
+        item = await _queue.get()
+        stopping = item is None
+        rows: List[Tuple] = [] if stopping else [item]
+
+        # Take whatever else is already waiting, up to one batch
+        while not stopping and len(rows) < QUESTION_BATCH_SIZE and not _queue.empty():
+            item = _queue.get_nowait()
+            if item is None:
+                stopping = True
+            else:
+                rows.append(item)
+
+        if rows:
+            try:
+                db = await get_analytics_db()
+                await db.executemany(
+                    INSERT_QUESTION,
+                    [(datetime.fromtimestamp(ts).isoformat(), *values) for ts, *values in rows]
+                )
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Failed to save {len(rows)} student questions: {e}")
+
+        if stopping:
+            return
@@ -1,153 +1,224 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import Optional
-import httpx
+from pydantic import BaseModel
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from typing import Any, List, Optional
 import logging
 from utils.database import get_db
+from utils.http import get_http_client
+from utils.cache import cache_get, cache_set
+from utils.etag import compute_etag, is_not_modified, ETAG_CACHE_CONTROL
 from models.student import Student
 from config import settings
+import hashlib
 import json
+import uuid
 
 router = APIRouter()
 security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
+CLERK_VERIFY_URL = "https://api.clerk.com/v1/sessions/verify"
+CLERK_HEADERS = {
+    "Authorization": f"Bearer {settings.CLERK_SECRET_KEY}",
+    "Content-Type": "application/json"
+}
+
+# Verified sessions are cached briefly; rejections only long enough to absorb retries
+CLERK_CACHE_TTL = 120
+CLERK_REJECTED_CACHE_TTL = 5
+STUDENT_PK_CACHE_TTL = 3600
+
+
+class RegisterIn(BaseModel):
+    clerk_user_id: str
+    email: str
+    full_name: str
+    phone_number: Optional[str] = None
+    whatsapp_number: Optional[str] = None
+    age: Optional[int] = None
+    native_language: str = "Portuguese"
+    timezone: str = "America/Sao_Paulo"
+
+
+class ProfileUpdateIn(BaseModel):
+    # Only these fields may be changed through the profile endpoint
+    full_name: Optional[str] = None
+    phone_number: Optional[str] = None
+    whatsapp_number: Optional[str] = None
+    age: Optional[int] = None
+    learning_goals: Optional[str] = None
+    preferred_lesson_times: Optional[List[Any]] = None
+    timezone: Optional[str] = None
+    learning_style: Optional[str] = None
+    interests: Optional[List[str]] = None
+
 
 async def verify_clerk_token(token: str) -> dict:
-    """Verify token with Clerk."""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://api.clerk.com/v1/sessions/verify",
-            headers={
-                "Authorization": f"Bearer {settings.CLERK_SECRET_KEY}",
-                "Content-Type": "application/json"
-            },
+    """Verify token with Clerk, caching the result by token hash."""
+    cache_key = "clerk:" + hashlib.sha256(token.encode()).hexdigest()
+    clerk_data = await cache_get(cache_key)
+
+    if clerk_data is None:
+        response = await get_http_client().get(
+            CLERK_VERIFY_URL,
+            headers=CLERK_HEADERS,
             params={"token": token}
         )
 
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication token"
-            )
+        if response.status_code == 200:
+            clerk_data = response.json()
+            await cache_set(cache_key, clerk_data, CLERK_CACHE_TTL)
+        else:
+            # Don't remember Clerk outages, only tokens it actually rejected
+            if 400 <= response.status_code < 500:
+                await cache_set(cache_key, {}, CLERK_REJECTED_CACHE_TTL)
+            clerk_data = {}
 
-        return response.json()
+    if not clerk_data:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication token"
+        )
 
+    return clerk_data
 
-async def get_current_user(
+
+async def get_current_student_id(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
-) -> Student:
-    """Get current authenticated user."""
+) -> uuid.UUID:
+    """Get the primary key of the current authenticated user."""
     token = credentials.credentials
 
     # Verify token with Clerk
     clerk_data = await verify_clerk_token(token)
     user_id = clerk_data.get("user_id")
 
-    # Get or create student record
-    result = await db.execute(
-        select(Student).where(Student.clerk_user_id == user_id)
+    cache_key = f"student_pk:{user_id}"
+    student_pk = await cache_get(cache_key)
+    if student_pk:
+        return uuid.UUID(student_pk)
+
+    # Get or create student record in one statement
+    stmt = insert(Student).values(
+        clerk_user_id=user_id,
+        email=clerk_data.get("email"),
+        full_name=clerk_data.get("name", "Student")
     )
-    student = result.scalar_one_or_none()
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Student.clerk_user_id],
+        set_={"clerk_user_id": stmt.excluded.clerk_user_id}
+    ).returning(Student.id)
+    result = await db.execute(stmt)
+    student_id = result.scalar_one()
+    await db.commit()
+
+    await cache_set(cache_key, str(student_id), STUDENT_PK_CACHE_TTL)
+    return student_id
+
+
+async def get_current_user(
+    student_id: uuid.UUID = Depends(get_current_student_id),
+    db: AsyncSession = Depends(get_db)
+) -> Student:
+    """Get current authenticated user."""
+    # Primary key lookups can be served from the session identity map
+    student = await db.get(Student, student_id)
 
     if not student:
-        # Create new student record
-        student = Student(
-            clerk_user_id=user_id,
-            email=clerk_data.get("email"),
-            full_name=clerk_data.get("name", "Student")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
         )
-        db.add(student)
-        await db.commit()
-        await db.refresh(student)
 
     return student
 
 
 @router.post("/register")
 async def register(
-    user_data: dict,
+    user_data: RegisterIn,
     db: AsyncSession = Depends(get_db)
 ):
     """Register a new user after Clerk signup."""
-    try:
-        # Create student record
-        student = Student(
-            clerk_user_id=user_data["clerk_user_id"],
-            email=user_data["email"],
-            full_name=user_data["full_name"],
-            phone_number=user_data.get("phone_number"),
-            whatsapp_number=user_data.get("whatsapp_number"),
-            age=user_data.get("age"),
-            native_language=user_data.get("native_language", "Portuguese"),
-            timezone=user_data.get("timezone", "America/Sao_Paulo")
-        )
+    # Create student record
+    student = Student(**user_data.model_dump())
 
-        db.add(student)
+    db.add(student)
+    try:
         await db.commit()
-        await db.refresh(student)
-
-        return {
-            "message": "User registered successfully",
-            "student_id": str(student.id),
-            "needs_placement_test": True
-        }
-
-    except Exception as e:
-        logger.error(f"Registration error: {e}")
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+            status_code=status.HTTP_409_CONFLICT,
+            detail="User already registered"
         )
 
+    return {
+        "message": "User registered successfully",
+        "student_id": student.id,
+        "needs_placement_test": True
+    }
+
 
 @router.get("/me")
 async def get_me(
-    current_user: Student = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    student_id: uuid.UUID = Depends(get_current_student_id),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user profile."""
+    result = await db.execute(
+        select(
+            Student.id,
+            Student.email,
+            Student.full_name,
+            Student.english_level,
+            Student.subscription_status,
+            Student.trial_lessons_remaining,
+            Student.total_lessons_completed,
+            Student.placement_test_completed,
+            Student.updated_at
+        ).where(Student.id == student_id)
+    )
+    student = result.one()
+
+    etag = compute_etag(student.id, student.updated_at)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+
     return {
-        "id": str(current_user.id),
-        "email": current_user.email,
-        "full_name": current_user.full_name,
-        "english_level": current_user.english_level,
-        "subscription_status": current_user.subscription_status,
-        "trial_lessons_remaining": current_user.trial_lessons_remaining,
-        "total_lessons_completed": current_user.total_lessons_completed,
-        "placement_test_completed": current_user.placement_test_completed
+        "id": student.id,
+        "email": student.email,
+        "full_name": student.full_name,
+        "english_level": student.english_level,
+        "subscription_status": student.subscription_status,
+        "trial_lessons_remaining": student.trial_lessons_remaining,
+        "total_lessons_completed": student.total_lessons_completed,
+        "placement_test_completed": student.placement_test_completed
     }
 
 
 @router.put("/profile")
 async def update_profile(
-    profile_data: dict,
-    current_user: Student = Depends(get_current_user),
+    profile_data: ProfileUpdateIn,
+    student_id: uuid.UUID = Depends(get_current_student_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Update user profile."""
-    try:
-        # Update allowed fields
-        allowed_fields = [
-            "full_name", "phone_number", "whatsapp_number",
-            "age", "learning_goals", "preferred_lesson_times",
-            "timezone", "learning_style", "interests"
-        ]
-
-        for field in allowed_fields:
-            if field in profile_data:
-                setattr(current_user, field, profile_data[field])
+    # Update only the fields the client sent
+    values = profile_data.model_dump(exclude_unset=True)
 
+    if values:
+        await db.execute(
+            update(Student).where(Student.id == student_id).values(**values)
+        )
         await db.commit()
-        await db.refresh(current_user)
 
-        return {"message": "Profile updated successfully"}
-
-    except Exception as e:
-        logger.error(f"Profile update error: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
-        )
\ No newline at end of file
+    return {"message": "Profile updated successfully"}
@@ -1,149 +1,252 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from typing import Optional, List
-from datetime import datetime, timedelta
+from pydantic import BaseModel
+from sqlalchemy import select, update, exists, and_, cast, func, Integer
+from typing import Any, Optional, List
+from datetime import datetime, timedelta, timezone
 from models.student import Student
 from models.lesson import Lesson
-from models.curriculum import Curriculum
-from api.auth import get_current_user
-from services.claude_tutor import ClaudeTutor
-from utils.database import get_db
+from api.auth import get_current_user, get_current_student_id
+from services.claude_tutor import get_claude_tutor
+from utils.database import get_db, AsyncSessionLocal
+from utils.cache import cache_get, cache_set
+import hashlib
+import json
 import logging
 import uuid
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-claude_tutor = ClaudeTutor()
+
+
+class ScheduleLessonIn(BaseModel):
+    scheduled_start: datetime
+    duration_minutes: int = 60
+    lesson_type: str = "live"
+    topic: Optional[str] = None
+    curriculum_module: Optional[str] = None
+
+
+class LessonPerformanceIn(BaseModel):
+    engagement: Optional[float] = None
+    speaking_time: Optional[float] = None
+    pronunciation: Optional[float] = None
+    grammar: Optional[float] = None
+    vocabulary: Optional[float] = None
+    overall: Optional[float] = None
+
+
+class LessonContentIn(BaseModel):
+    vocabulary: Optional[Any] = None
+    grammar: Optional[Any] = None
+    homework: Optional[Any] = None
+
+
+class EndLessonIn(BaseModel):
+    performance: Optional[LessonPerformanceIn] = None
+    content: Optional[LessonContentIn] = None
+    ai_feedback: Optional[str] = None
+
+
+class RateLessonIn(BaseModel):
+    rating: float
+    feedback: Optional[str] = None
+
+DEFAULT_LESSON_TOPIC = "General English Practice"
+LESSON_PLAN_CACHE_TTL = 86400
+
+
+def build_student_profile(student: Student) -> dict:
+    """Student fields used to personalise lesson plans."""
+    return {
+        "full_name": student.full_name,
+        "english_level": student.english_level or "B1",
+        "learning_style": student.learning_style,
+        "weak_areas": student.weak_areas or [],
+        "interests": student.interests or []
+    }
+
+
+async def get_lesson_plan(
+    student_profile: dict,
+    topic: str,
+    duration_minutes: int,
+    curriculum_module: Optional[str]
+) -> dict:
+    """Get a lesson plan for the student's level, reusing cached plans."""
+    # Only non-personal fields shape the plan; the tutor personalises it live
+    plan_profile = {
+        "english_level": student_profile["english_level"],
+        "learning_style": student_profile["learning_style"]
+    }
+    fingerprint = json.dumps(
+        {
+            **plan_profile,
+            "topic": topic,
+            "curriculum_module": curriculum_module,
+            "duration_minutes": duration_minutes
+        },
+        sort_keys=True
+    )
+    cache_key = "lesson_plan:" + hashlib.sha1(fingerprint.encode()).hexdigest()
+
+    lesson_plan = await cache_get(cache_key)
+    if lesson_plan is None:
+        lesson_plan = await get_claude_tutor().generate_lesson_plan(
+            student_profile=plan_profile,
+            topic=topic,
+            duration_minutes=duration_minutes,
+            curriculum_module=curriculum_module
+        )
+        # Don't cache the placeholder plan returned when parsing fails
+        if "raw_response" not in lesson_plan:
+            await cache_set(cache_key, lesson_plan, LESSON_PLAN_CACHE_TTL)
+
+    return lesson_plan
+
+
+async def generate_plan_for_lesson(
+    lesson_id: uuid.UUID,
+    student_profile: dict,
+    topic: str,
+    duration_minutes: int,
+    curriculum_module: Optional[str]
+):
+    """Generate a lesson plan in the background and attach it to the lesson."""
+    try:
+        lesson_plan = await get_lesson_plan(
+            student_profile=student_profile,
+            topic=topic,
+            duration_minutes=duration_minutes,
+            curriculum_module=curriculum_module
+        )
+    except Exception as e:
+        logger.error(f"Error generating lesson plan for {lesson_id}: {e}")
+        return
+
+    # Once started, the lesson keeps the plan start_lesson handed out
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Lesson)
+            .where(Lesson.id == lesson_id, Lesson.status == "scheduled")
+            .values(lesson_plan=lesson_plan)
+        )
+        await db.commit()
 
 
 @router.post("/schedule")
 async def schedule_lesson(
-    lesson_data: dict,
+    lesson_data: ScheduleLessonIn,
+    background_tasks: BackgroundTasks,
     current_user: Student = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Schedule a new lesson."""
-    try:
-        # Check if time slot is available
-        scheduled_start = datetime.fromisoformat(lesson_data["scheduled_start"])
-        duration_minutes = lesson_data.get("duration_minutes", 60)
-        scheduled_end = scheduled_start + timedelta(minutes=duration_minutes)
-
-        # Check for conflicts
-        conflict = await db.execute(
-            select(Lesson).where(
-                and_(
-                    Lesson.student_id == current_user.id,
-                    Lesson.status.in_(["scheduled", "in_progress"]),
-                    Lesson.scheduled_start < scheduled_end,
-                    Lesson.scheduled_end > scheduled_start
-                )
+    # Check if time slot is available
+    scheduled_start = lesson_data.scheduled_start
+    if scheduled_start.tzinfo is None:
+        scheduled_start = scheduled_start.replace(tzinfo=timezone.utc)
+    duration_minutes = lesson_data.duration_minutes
+    scheduled_end = scheduled_start + timedelta(minutes=duration_minutes)
+
+    # Check for conflicts
+    conflict = await db.scalar(
+        select(exists().where(
+            and_(
+                Lesson.student_id == current_user.id,
+                Lesson.status.in_(["scheduled", "in_progress"]),
+                Lesson.scheduled_start < scheduled_end,
+                Lesson.scheduled_end > scheduled_start
             )
+        ))
+    )
+
+    if conflict:
+        raise HTTPException(
+            status_code=400,
+            detail="Time slot conflicts with existing lesson"
         )
 
-        if conflict.scalar_one_or_none():
+    # Check subscription or trial lessons
+    if current_user.subscription_status == "trial":
+        if current_user.trial_lessons_remaining <= 0:
             raise HTTPException(
-                status_code=400,
-                detail="Time slot conflicts with existing lesson"
-            )
-
-        # Check subscription or trial lessons
-        if current_user.subscription_status == "trial":
-            if current_user.trial_lessons_remaining <= 0:
-                raise HTTPException(
-                    status_code=403,
-                    detail="No trial lessons remaining. Please subscribe."
-                )
-
-        # Get curriculum module if specified
-        curriculum_module = None
-        if lesson_data.get("curriculum_module"):
-            result = await db.execute(
-                select(Curriculum).where(
-                    Curriculum.module_code == lesson_data["curriculum_module"]
-                )
+                status_code=403,
+                detail="No trial lessons remaining. Please subscribe."
             )
-            curriculum_module = result.scalar_one_or_none()
-
-        # Generate lesson plan
-        student_profile = {
-            "full_name": current_user.full_name,
-            "english_level": current_user.english_level or "B1",
-            "learning_style": current_user.learning_style,
-            "weak_areas": current_user.weak_areas or [],
-            "interests": current_user.interests or []
-        }
-
-        lesson_plan = await claude_tutor.generate_lesson_plan(
-            student_profile=student_profile,
-            topic=lesson_data.get("topic", "General English Practice"),
-            duration_minutes=duration_minutes,
-            curriculum_module=lesson_data.get("curriculum_module")
-        )
 
-        # Create lesson
-        lesson = Lesson(
-            student_id=current_user.id,
-            scheduled_start=scheduled_start,
-            scheduled_end=scheduled_end,
-            duration_minutes=duration_minutes,
-            lesson_type=lesson_data.get("lesson_type", "live"),
-            status="scheduled",
-            topic=lesson_data.get("topic"),
-            lesson_plan=lesson_plan,
-            curriculum_module=lesson_data.get("curriculum_module"),
-            difficulty_level=current_user.english_level
-        )
+    # Create lesson; the plan is generated after the response is sent
+    lesson = Lesson(
+        student_id=current_user.id,
+        scheduled_start=scheduled_start,
+        scheduled_end=scheduled_end,
+        duration_minutes=duration_minutes,
+        lesson_type=lesson_data.lesson_type,
+        status="scheduled",
+        topic=lesson_data.topic,
+        curriculum_module=lesson_data.curriculum_module,
+        difficulty_level=current_user.english_level
+    )
 
-        db.add(lesson)
+    db.add(lesson)
 
-        # Decrement trial lessons if applicable
-        if current_user.subscription_status == "trial":
-            current_user.trial_lessons_remaining -= 1
+    # Decrement trial lessons if applicable
+    if current_user.subscription_status == "trial":
+        current_user.trial_lessons_remaining -= 1
 
-        await db.commit()
-        await db.refresh(lesson)
+    await db.commit()
 
-        return {
-            "message": "Lesson scheduled successfully",
-            "lesson_id": str(lesson.id),
-            "scheduled_start": lesson.scheduled_start.isoformat(),
-            "scheduled_end": lesson.scheduled_end.isoformat()
-        }
+    background_tasks.add_task(
+        generate_plan_for_lesson,
+        lesson.id,
+        build_student_profile(current_user),
+        lesson_data.topic or DEFAULT_LESSON_TOPIC,
+        duration_minutes,
+        lesson_data.curriculum_module
+    )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error scheduling lesson: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "message": "Lesson scheduled successfully",
+        "lesson_id": lesson.id,
+        "scheduled_start": lesson.scheduled_start,
+        "scheduled_end": lesson.scheduled_end
+    }
 
 
 @router.get("/upcoming")
 async def get_upcoming_lessons(
     limit: int = Query(10, ge=1, le=50),
-    current_user: Student = Depends(get_current_user),
+    student_id: uuid.UUID = Depends(get_current_student_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Get upcoming lessons."""
+    now = datetime.now(timezone.utc)
     result = await db.execute(
-        select(Lesson)
+        select(
+            Lesson.id,
+            Lesson.scheduled_start,
+            Lesson.scheduled_end,
+            Lesson.duration_minutes,
+            Lesson.topic,
+            Lesson.lesson_type,
+            Lesson.curriculum_module
+        )
         .where(
-            Lesson.student_id == current_user.id,
-            Lesson.scheduled_start > datetime.utcnow(),
+            Lesson.student_id == student_id,
+            Lesson.scheduled_start > now,
             Lesson.status == "scheduled"
         )
         .order_by(Lesson.scheduled_start)
         .limit(limit)
     )
-    lessons = result.scalars().all()
+    lessons = result.all()
 
     return {
         "lessons": [
             {
-                "id": str(lesson.id),
-                "scheduled_start": lesson.scheduled_start.isoformat(),
-                "scheduled_end": lesson.scheduled_end.isoformat(),
+                "id": lesson.id,
+                "scheduled_start": lesson.scheduled_start,
+                "scheduled_end": lesson.scheduled_end,
                 "duration_minutes": lesson.duration_minutes,
                 "topic": lesson.topic,
                 "lesson_type": lesson.lesson_type,
@@ -156,14 +259,14 @@ async def get_upcoming_lessons(
 
 @router.get("/{lesson_id}")
 async def get_lesson(
-    lesson_id: str,
+    lesson_id: uuid.UUID,
     current_user: Student = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get lesson details."""
     result = await db.execute(
         select(Lesson).where(
-            Lesson.id == uuid.UUID(lesson_id),
+            Lesson.id == lesson_id,
             Lesson.student_id == current_user.id
         )
     )
@@ -173,11 +276,11 @@ async def get_lesson(
         raise HTTPException(status_code=404, detail="Lesson not found")
 
     return {
-        "id": str(lesson.id),
-        "scheduled_start": lesson.scheduled_start.isoformat(),
-        "scheduled_end": lesson.scheduled_end.isoformat(),
-        "actual_start": lesson.actual_start.isoformat() if lesson.actual_start else None,
-        "actual_end": lesson.actual_end.isoformat() if lesson.actual_end else None,
+        "id": lesson.id,
+        "scheduled_start": lesson.scheduled_start,
+        "scheduled_end": lesson.scheduled_end,
+        "actual_start": lesson.actual_start,
+        "actual_end": lesson.actual_end,
         "status": lesson.status,
         "topic": lesson.topic,
         "lesson_plan": lesson.lesson_plan,
@@ -200,86 +303,120 @@ async def get_lesson(
 
 @router.post("/{lesson_id}/start")
 async def start_lesson(
-    lesson_id: str,
+    lesson_id: uuid.UUID,
     current_user: Student = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Start a scheduled lesson."""
+    now = datetime.now(timezone.utc)
+
+    # Status check and transition in one statement
     result = await db.execute(
-        select(Lesson).where(
-            Lesson.id == uuid.UUID(lesson_id),
+        update(Lesson)
+        .where(
+            Lesson.id == lesson_id,
             Lesson.student_id == current_user.id,
             Lesson.status == "scheduled"
         )
+        .values(status="in_progress", actual_start=now)
+        .returning(
+            Lesson.id, Lesson.lesson_plan, Lesson.topic,
+            Lesson.duration_minutes, Lesson.curriculum_module
+        )
     )
-    lesson = result.scalar_one_or_none()
+    lesson = result.one_or_none()
 
     if not lesson:
         raise HTTPException(status_code=404, detail="Lesson not found or already started")
 
-    # Update lesson status
-    lesson.status = "in_progress"
-    lesson.actual_start = datetime.utcnow()
-
     await db.commit()
 
+    lesson_plan = lesson.lesson_plan
+    if lesson_plan is None:
+        # Background generation hasn't finished (or failed); generate on demand
+        lesson_plan = await get_lesson_plan(
+            student_profile=build_student_profile(current_user),
+            topic=lesson.topic or DEFAULT_LESSON_TOPIC,
+            duration_minutes=lesson.duration_minutes,
+            curriculum_module=lesson.curriculum_module
+        )
+        await db.execute(
+            update(Lesson).where(Lesson.id == lesson.id).values(lesson_plan=lesson_plan)
+        )
+        await db.commit()
+
     return {
         "message": "Lesson started",
-        "lesson_id": str(lesson.id),
-        "lesson_plan": lesson.lesson_plan
+        "lesson_id": lesson.id,
+        "lesson_plan": lesson_plan
     }
 
 
 @router.post("/{lesson_id}/end")
 async def end_lesson(
-    lesson_id: str,
-    summary_data: dict,
-    current_user: Student = Depends(get_current_user),
+    lesson_id: uuid.UUID,
+    summary_data: EndLessonIn,
+    student_id: uuid.UUID = Depends(get_current_student_id),
     db: AsyncSession = Depends(get_db)
 ):
     """End a lesson and save summary."""
-    result = await db.execute(
-        select(Lesson).where(
-            Lesson.id == uuid.UUID(lesson_id),
-            Lesson.student_id == current_user.id,
-            Lesson.status == "in_progress"
-        )
-    )
-    lesson = result.scalar_one_or_none()
-
-    if not lesson:
-        raise HTTPException(status_code=404, detail="Active lesson not found")
+    now = datetime.now(timezone.utc)
 
     # Update lesson with summary data
-    lesson.status = "completed"
-    lesson.actual_end = datetime.utcnow()
-    lesson.duration_minutes = int(
-        (lesson.actual_end - lesson.actual_start).total_seconds() / 60
-    )
+    values = {
+        "status": "completed",
+        "actual_end": now,
+        "duration_minutes": cast(
+            func.floor(func.extract("epoch", now - Lesson.actual_start) / 60), Integer
+        )
+    }
 
     # Save performance metrics
-    if "performance" in summary_data:
-        lesson.student_engagement_score = summary_data["performance"].get("engagement")
-        lesson.speaking_time_percentage = summary_data["performance"].get("speaking_time")
-        lesson.pronunciation_score = summary_data["performance"].get("pronunciation")
-        lesson.grammar_accuracy_score = summary_data["performance"].get("grammar")
-        lesson.vocabulary_usage_score = summary_data["performance"].get("vocabulary")
-        lesson.overall_performance_score = summary_data["performance"].get("overall")
+    performance = summary_data.performance
+    if performance is not None:
+        values["student_engagement_score"] = performance.engagement
+        values["speaking_time_percentage"] = performance.speaking_time
+        values["pronunciation_score"] = performance.pronunciation
+        values["grammar_accuracy_score"] = performance.grammar
+        values["vocabulary_usage_score"] = performance.vocabulary
+        values["overall_performance_score"] = performance.overall
 
     # Save content covered
-    if "content" in summary_data:
-        lesson.vocabulary_taught = summary_data["content"].get("vocabulary")
-        lesson.grammar_points = summary_data["content"].get("grammar")
-        lesson.homework_assigned = summary_data["content"].get("homework")
+    content = summary_data.content
+    if content is not None:
+        values["vocabulary_taught"] = content.vocabulary
+        values["grammar_points"] = content.grammar
+        values["homework_assigned"] = content.homework
 
     # Save AI feedback
-    if "ai_feedback" in summary_data:
-        lesson.ai_feedback = summary_data["ai_feedback"]
+    if summary_data.ai_feedback is not None:
+        values["ai_feedback"] = summary_data.ai_feedback
 
-    # Update student statistics
-    current_user.total_lessons_completed += 1
-    current_user.total_minutes_studied += lesson.duration_minutes
-    current_user.last_active_date = datetime.utcnow()
+    result = await db.execute(
+        update(Lesson)
+        .where(
+            Lesson.id == lesson_id,
+            Lesson.student_id == student_id,
+            Lesson.status == "in_progress"
+        )
+        .values(**values)
+        .returning(Lesson.duration_minutes, Lesson.overall_performance_score)
+    )
+    lesson = result.one_or_none()
+
+    if not lesson:
+        raise HTTPException(status_code=404, detail="Active lesson not found")
+
+    # Update student statistics atomically
+    await db.execute(
+        update(Student)
+        .where(Student.id == student_id)
+        .values(
+            total_lessons_completed=Student.total_lessons_completed + 1,
+            total_minutes_studied=Student.total_minutes_studied + lesson.duration_minutes,
+            last_active_date=now
+        )
+    )
 
     await db.commit()
 
@@ -292,26 +429,31 @@ async def end_lesson(
 
 @router.post("/{lesson_id}/cancel")
 async def cancel_lesson(
-    lesson_id: str,
+    lesson_id: uuid.UUID,
     reason: Optional[str] = None,
     current_user: Student = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Cancel a scheduled lesson."""
+    now = datetime.now(timezone.utc)
+
     result = await db.execute(
-        select(Lesson).where(
-            Lesson.id == uuid.UUID(lesson_id),
+        update(Lesson)
+        .where(
+            Lesson.id == lesson_id,
             Lesson.student_id == current_user.id,
             Lesson.status == "scheduled"
         )
+        .values(status="canceled", canceled_at=now, cancellation_reason=reason)
+        .returning(Lesson.scheduled_start)
     )
-    lesson = result.scalar_one_or_none()
+    lesson = result.one_or_none()
 
     if not lesson:
         raise HTTPException(status_code=404, detail="Scheduled lesson not found")
 
     # Check cancellation policy (24 hours notice)
-    if (lesson.scheduled_start - datetime.utcnow()).total_seconds() < 86400:
+    if (lesson.scheduled_start - now).total_seconds() < 86400:
         # Less than 24 hours notice
         if current_user.subscription_status == "trial":
             # Don't refund trial lesson
@@ -320,13 +462,9 @@ async def cancel_lesson(
             # Apply cancellation policy for paid users
             pass
 
-    lesson.status = "canceled"
-    lesson.canceled_at = datetime.utcnow()
-    lesson.cancellation_reason = reason
-
     # Refund trial lesson if applicable
     if current_user.subscription_status == "trial":
-        if (lesson.scheduled_start - datetime.utcnow()).total_seconds() >= 86400:
+        if (lesson.scheduled_start - now).total_seconds() >= 86400:
             current_user.trial_lessons_remaining += 1
 
     await db.commit()
@@ -336,27 +474,26 @@ async def cancel_lesson(
 
 @router.post("/{lesson_id}/rate")
 async def rate_lesson(
-    lesson_id: str,
-    rating_data: dict,
+    lesson_id: uuid.UUID,
+    rating_data: RateLessonIn,
     current_user: Student = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Rate a completed lesson."""
     result = await db.execute(
-        select(Lesson).where(
-            Lesson.id == uuid.UUID(lesson_id),
+        update(Lesson)
+        .where(
+            Lesson.id == lesson_id,
             Lesson.student_id == current_user.id,
             Lesson.status == "completed"
         )
+        .values(student_rating=rating_data.rating, student_feedback=rating_data.feedback)
+        .returning(Lesson.id)
     )
-    lesson = result.scalar_one_or_none()
 
-    if not lesson:
+    if result.one_or_none() is None:
         raise HTTPException(status_code=404, detail="Completed lesson not found")
 
-    lesson.student_rating = rating_data["rating"]
-    lesson.student_feedback = rating_data.get("feedback")
-
     await db.commit()
 
     return {"message": "Thank you for your feedback!"}
\ No newline at end of file
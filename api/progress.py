@@ -1,65 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy import select, update
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Response
+from sqlalchemy import select, update, func, literal
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from datetime import datetime, date
 
-from database import get_db, User, UserProgress, Conversation, LearningStreak, Achievement
+from database import get_db, upsert, User, UserProgress, CompletedLesson, Conversation, LearningStreak, Achievement
 from auth import get_current_user
+from utils.etag import compute_etag, is_not_modified, ETAG_CACHE_CONTROL
 
 router = APIRouter(prefix="/api/progress", tags=["Progress"])
 
 
 @router.get("/")
 async def get_user_progress(
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get current user's progress."""
-    # Find or create user
+    # User, progress and streak in one round trip
     result = await db.execute(
-        select(User).where(User.clerk_id == current_user["user_id"])
+        select(User.id, UserProgress, LearningStreak.current_streak, LearningStreak.longest_streak)
+        .outerjoin(UserProgress, UserProgress.user_id == User.id)
+        .outerjoin(LearningStreak, LearningStreak.user_id == User.id)
+        .where(User.clerk_id == current_user["user_id"])
     )
-    user = result.scalar_one_or_none()
+    row = result.first()
 
-    if not user:
-        # Create new user
-        user = User(
+    if row:
+        user_id, progress, current_streak, longest_streak = row
+    else:
+        # Create user atomically; a concurrent first request gets the same row back
+        stmt = upsert(User).values(
             clerk_id=current_user["user_id"],
             email=current_user["email"],
             name=current_user.get("name", "")
         )
-        db.add(user)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.clerk_id],
+            set_={"clerk_id": stmt.excluded.clerk_id}
+        ).returning(User.id)
+        user_id = (await db.execute(stmt)).scalar_one()
+        progress, current_streak, longest_streak = None, None, None
+
+    if progress is None:
+        stmt = upsert(UserProgress).values(user_id=user_id)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserProgress.user_id],
+            set_={"user_id": stmt.excluded.user_id}
+        ).returning(UserProgress)
+        progress = (await db.execute(stmt)).scalar_one()
         await db.commit()
-        await db.refresh(user)
 
-    # Get or create progress
-    result = await db.execute(
-        select(UserProgress).where(UserProgress.user_id == user.id)
+    # updated_at alone can repeat within a second on SQLite, so the position
+    # and streak (stored separately) are part of the ETag too
+    etag = compute_etag(
+        progress.updated_at,
+        progress.current_level,
+        progress.current_module,
+        progress.current_lesson,
+        progress.total_lessons_completed,
+        current_streak,
+        longest_streak
     )
-    progress = result.scalar_one_or_none()
-
-    if not progress:
-        progress = UserProgress(user_id=user.id)
-        db.add(progress)
-        await db.commit()
-        await db.refresh(progress)
-
-    # Get streak
-    result = await db.execute(
-        select(LearningStreak).where(LearningStreak.user_id == user.id)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+
+    # Only fetched for a full response; completing a lesson bumps total_lessons_completed and the ETag
+    completed = await db.execute(
+        select(CompletedLesson.level, CompletedLesson.module, CompletedLesson.lesson)
+        .where(CompletedLesson.user_id == user_id)
+        .order_by(CompletedLesson.completed_at)
     )
-    streak = result.scalar_one_or_none()
 
     return {
         "current_level": progress.current_level,
         "current_module": progress.current_module,
         "current_lesson": progress.current_lesson,
-        "completed_lessons": progress.completed_lessons or [],
+        "completed_lessons": [
+            {"level": level, "module": module, "lesson": lesson}
+            for level, module, lesson in completed
+        ],
         "total_lessons_completed": progress.total_lessons_completed,
-        "current_streak": streak.current_streak if streak else 0,
-        "longest_streak": streak.longest_streak if streak else 0,
-        "updated_at": progress.updated_at.isoformat() if progress.updated_at else None
+        "current_streak": current_streak or 0,
+        "longest_streak": longest_streak or 0,
+        "updated_at": progress.updated_at
     }
 
 
@@ -72,35 +100,64 @@ async def save_progress(
     db: AsyncSession = Depends(get_db)
 ):
     """Save user's current position in curriculum."""
-    # Get user
-    result = await db.execute(
-        select(User).where(User.clerk_id == current_user["user_id"])
+    # Insert or update progress for the user in a single statement
+    stmt = upsert(UserProgress).from_select(
+        ["user_id", "current_level", "current_module", "current_lesson"],
+        select(User.id, literal(level), literal(module), literal(lesson))
+        .where(User.clerk_id == current_user["user_id"])
     )
-    user = result.scalar_one_or_none()
-
-    if not user:
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserProgress.user_id],
+        set_={
+            "current_level": stmt.excluded.current_level,
+            "current_module": stmt.excluded.current_module,
+            "current_lesson": stmt.excluded.current_lesson,
+            "updated_at": func.now()
+        }
+    ).returning(UserProgress.id)
+    result = await db.execute(stmt)
+
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Update progress
-    result = await db.execute(
-        select(UserProgress).where(UserProgress.user_id == user.id)
-    )
-    progress = result.scalar_one_or_none()
+    await db.commit()
 
-    if progress:
-        progress.current_level = level
-        progress.current_module = module
-        progress.current_lesson = lesson
-        progress.updated_at = datetime.utcnow()
-    else:
-        progress = UserProgress(
-            user_id=user.id,
-            current_level=level,
-            current_module=module,
-            current_lesson=lesson
+    return {"message": "Progress saved successfully"}
+
+
+@router.post("/complete")
+async def complete_lesson(
+    level: int = Body(...),
+    module: int = Body(...),
+    lesson: int = Body(...),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Mark a lesson as completed for the current user."""
+    user_id = (await db.execute(
+        select(User.id).where(User.clerk_id == current_user["user_id"])
+    )).scalar_one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Repeat completions hit the primary key and insert nothing
+    stmt = upsert(CompletedLesson).values(
+        user_id=user_id, level=level, module=module, lesson=lesson
+    ).on_conflict_do_nothing().returning(CompletedLesson.user_id)
+    newly_completed = (await db.execute(stmt)).scalar_one_or_none() is not None
+
+    if newly_completed:
+        # The progress row may not exist yet; create it with this first lesson counted
+        stmt = upsert(UserProgress).values(user_id=user_id, total_lessons_completed=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserProgress.user_id],
+            set_={
+                "total_lessons_completed": UserProgress.total_lessons_completed + 1,
+                "updated_at": func.now()
+            }
         )
-        db.add(progress)
+        await db.execute(stmt)
 
     await db.commit()
 
-    return {"message": "Progress saved successfully"}
+    return {"message": "Lesson completed", "newly_completed": newly_completed}
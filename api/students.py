@@ -1,46 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy.orm import load_only
+from sqlalchemy import select, func, cast, literal_column, Date
 from typing import Optional, List
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from models.student import Student
 from models.lesson import Lesson
 from models.progress import Progress
 from api.auth import get_current_user
-from utils.database import get_db
+from utils.database import get_db, AsyncSessionLocal
+from utils.etag import compute_etag, is_not_modified, ETAG_CACHE_CONTROL
+import asyncio
 import logging
+from functools import lru_cache
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+async def _fetch_upcoming_lessons(student_id, now: datetime) -> List[Lesson]:
+    """Next scheduled lessons, on a session of its own."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Lesson)
+            .options(load_only(
+                Lesson.id, Lesson.scheduled_start, Lesson.topic, Lesson.duration_minutes
+            ))
+            .where(
+                Lesson.student_id == student_id,
+                Lesson.scheduled_start > now,
+                Lesson.status.in_(["scheduled"])
+            )
+            .order_by(Lesson.scheduled_start)
+            .limit(5)
+        )
+        return result.scalars().all()
+
+
+async def _fetch_latest_progress(student_id) -> Optional[Progress]:
+    """Most recent progress assessment, on a session of its own."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Progress)
+            .options(load_only(
+                Progress.overall_level, Progress.cefr_level, Progress.assessment_date
+            ))
+            .where(Progress.student_id == student_id)
+            .order_by(Progress.assessment_date.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+
 @router.get("/dashboard")
 async def get_dashboard(
-    current_user: Student = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: Student = Depends(get_current_user)
 ):
     """Get student dashboard data."""
-    # Get upcoming lessons
-    upcoming_lessons = await db.execute(
-        select(Lesson)
-        .where(
-            Lesson.student_id == current_user.id,
-            Lesson.scheduled_start > datetime.utcnow(),
-            Lesson.status.in_(["scheduled"])
-        )
-        .order_by(Lesson.scheduled_start)
-        .limit(5)
-    )
-    upcoming = upcoming_lessons.scalars().all()
-
-    # Get recent progress
-    recent_progress = await db.execute(
-        select(Progress)
-        .where(Progress.student_id == current_user.id)
-        .order_by(Progress.assessment_date.desc())
-        .limit(1)
+    # Upcoming lessons and recent progress are independent, so fetch them
+    # concurrently (an AsyncSession can't run two queries at once)
+    upcoming, progress = await asyncio.gather(
+        _fetch_upcoming_lessons(current_user.id, datetime.now(timezone.utc)),
+        _fetch_latest_progress(current_user.id)
     )
-    progress = recent_progress.scalar_one_or_none()
 
     # Calculate study streak
     today = datetime.utcnow().date()
@@ -61,8 +83,8 @@ async def get_dashboard(
         },
         "upcoming_lessons": [
             {
-                "id": str(lesson.id),
-                "scheduled_start": lesson.scheduled_start.isoformat(),
+                "id": lesson.id,
+                "scheduled_start": lesson.scheduled_start,
                 "topic": lesson.topic,
                 "duration_minutes": lesson.duration_minutes
             }
@@ -71,7 +93,7 @@ async def get_dashboard(
         "recent_progress": {
             "overall_level": progress.overall_level if progress else None,
             "cefr_level": progress.cefr_level if progress else None,
-            "last_assessment": progress.assessment_date.isoformat() if progress else None
+            "last_assessment": progress.assessment_date if progress else None
         }
     }
 
@@ -86,35 +108,45 @@ async def get_learning_history(
     """Get student's learning history."""
     offset = (page - 1) * limit
 
-    # Get completed lessons
+    completed = (
+        Lesson.student_id == current_user.id,
+        Lesson.status == "completed"
+    )
+
+    # Get completed lessons with the total count folded into the same query
     result = await db.execute(
-        select(Lesson)
-        .where(
-            Lesson.student_id == current_user.id,
-            Lesson.status == "completed"
+        select(
+            Lesson.id,
+            Lesson.scheduled_start,
+            Lesson.topic,
+            Lesson.duration_minutes,
+            Lesson.overall_performance_score,
+            Lesson.student_rating,
+            func.count().over().label("total_rows")
         )
+        .where(*completed)
         .order_by(Lesson.scheduled_start.desc())
         .offset(offset)
         .limit(limit)
     )
-    lessons = result.scalars().all()
+    lessons = result.all()
 
-    # Get total count
-    count_result = await db.execute(
-        select(func.count())
-        .select_from(Lesson)
-        .where(
-            Lesson.student_id == current_user.id,
-            Lesson.status == "completed"
+    if lessons:
+        total = lessons[0].total_rows
+    elif offset == 0:
+        total = 0
+    else:
+        # Past the last page the window has no rows to report the total on
+        count_result = await db.execute(
+            select(func.count()).select_from(Lesson).where(*completed)
         )
-    )
-    total = count_result.scalar()
+        total = count_result.scalar()
 
     return {
         "lessons": [
             {
-                "id": str(lesson.id),
-                "date": lesson.scheduled_start.isoformat(),
+                "id": lesson.id,
+                "date": lesson.scheduled_start,
                 "topic": lesson.topic,
                 "duration_minutes": lesson.duration_minutes,
                 "performance_score": lesson.overall_performance_score,
@@ -131,52 +163,62 @@ async def get_learning_history(
     }
 
 
+# (student stat, threshold, id, name, description, icon)
+_ACHIEVEMENT_RULES = (
+    ("lessons", 10, "10_lessons", "Getting Started", "Complete 10 lessons", "🎯"),
+    ("lessons", 50, "50_lessons", "Dedicated Learner", "Complete 50 lessons", "⭐"),
+    ("streak", 7, "7_day_streak", "Week Warrior", "7-day learning streak", "🔥"),
+    ("minutes", 600, "10_hours", "Time Investor", "Study for 10 hours", "⏰"),
+)
+
+
+@lru_cache(maxsize=1024)
+def _earned_achievements(lessons: int, streak: int, minutes: int) -> tuple:
+    """Achievements unlocked by the given totals."""
+    stats = {"lessons": lessons, "streak": streak, "minutes": minutes}
+    return tuple(
+        {
+            "id": achievement_id,
+            "name": name,
+            "description": description,
+            "icon": icon,
+            # Unlock times aren't recorded, so don't report one
+            "earned_at": None
+        }
+        for stat, threshold, achievement_id, name, description, icon in _ACHIEVEMENT_RULES
+        if stats[stat] >= threshold
+    )
+
+
 @router.get("/achievements")
 async def get_achievements(
-    current_user: Student = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: Student = Depends(get_current_user)
 ):
     """Get student achievements and badges."""
-    achievements = []
-
-    # Check various achievements
-    if current_user.total_lessons_completed >= 10:
-        achievements.append({
-            "id": "10_lessons",
-            "name": "Getting Started",
-            "description": "Complete 10 lessons",
-            "icon": "🎯",
-            "earned_at": datetime.utcnow().isoformat()
-        })
-
-    if current_user.total_lessons_completed >= 50:
-        achievements.append({
-            "id": "50_lessons",
-            "name": "Dedicated Learner",
-            "description": "Complete 50 lessons",
-            "icon": "⭐",
-            "earned_at": datetime.utcnow().isoformat()
-        })
-
-    if current_user.current_streak_days >= 7:
-        achievements.append({
-            "id": "7_day_streak",
-            "name": "Week Warrior",
-            "description": "7-day learning streak",
-            "icon": "🔥",
-            "earned_at": datetime.utcnow().isoformat()
-        })
-
-    if current_user.total_minutes_studied >= 600:
-        achievements.append({
-            "id": "10_hours",
-            "name": "Time Investor",
-            "description": "Study for 10 hours",
-            "icon": "⏰",
-            "earned_at": datetime.utcnow().isoformat()
-        })
-
-    return {"achievements": achievements}
+    stats = (
+        current_user.total_lessons_completed or 0,
+        current_user.current_streak_days or 0,
+        current_user.total_minutes_studied or 0
+    )
+
+    # Achievements only change with these totals
+    etag = compute_etag(current_user.id, *stats)
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+
+    return {"achievements": list(_earned_achievements(*stats))}
+
+
+# Calendar-aware windows for study stats ("1 month" rather than 30 days)
+STUDY_STATS_PERIODS = {
+    "week": literal_column("INTERVAL '7 days'"),
+    "month": literal_column("INTERVAL '1 month'"),
+    "year": literal_column("INTERVAL '1 year'"),
+}
 
 
 @router.get("/study-stats")
@@ -186,45 +228,44 @@ async def get_study_stats(
     db: AsyncSession = Depends(get_db)
 ):
     """Get detailed study statistics."""
-    # Calculate date range
-    end_date = datetime.utcnow()
-    if period == "week":
-        start_date = end_date - timedelta(days=7)
-    elif period == "month":
-        start_date = end_date - timedelta(days=30)
-    elif period == "year":
-        start_date = end_date - timedelta(days=365)
-    else:  # all
-        start_date = current_user.created_at
-
-    # Get lessons in period
+    # Calculate date range in the database, relative to NOW()
+    end_date = func.now()
+    if period == "all":
+        start_date = current_user.created_at.replace(tzinfo=timezone.utc)
+    else:
+        start_date = end_date - STUDY_STATS_PERIODS[period]
+
+    # Aggregate completed lessons per (UTC) day in the database
+    day = cast(func.timezone(literal_column("'UTC'"), Lesson.scheduled_start), Date).label("day")
     result = await db.execute(
-        select(Lesson)
+        select(
+            day,
+            func.count().label("lessons"),
+            func.coalesce(func.sum(Lesson.duration_minutes), 0).label("minutes"),
+            func.coalesce(func.sum(Lesson.overall_performance_score), 0).label("performance")
+        )
         .where(
             Lesson.student_id == current_user.id,
             Lesson.status == "completed",
             Lesson.scheduled_start >= start_date,
             Lesson.scheduled_start <= end_date
         )
-    )
-    lessons = result.scalars().all()
-
-    # Calculate statistics
-    total_lessons = len(lessons)
-    total_minutes = sum(lesson.duration_minutes or 0 for lesson in lessons)
-    avg_performance = (
-        sum(lesson.overall_performance_score or 0 for lesson in lessons) / total_lessons
-        if total_lessons > 0 else 0
+        .group_by(day)
+        .order_by(day)
     )
 
-    # Group by day for chart data
+    # Period totals from the per-day rows
+    total_lessons = 0
+    total_minutes = 0
+    total_performance = 0
     daily_stats = {}
-    for lesson in lessons:
-        day = lesson.scheduled_start.date().isoformat()
-        if day not in daily_stats:
-            daily_stats[day] = {"lessons": 0, "minutes": 0}
-        daily_stats[day]["lessons"] += 1
-        daily_stats[day]["minutes"] += lesson.duration_minutes or 0
+    for row in result:
+        total_lessons += row.lessons
+        total_minutes += row.minutes
+        total_performance += row.performance
+        daily_stats[row.day.isoformat()] = {"lessons": row.lessons, "minutes": row.minutes}
+
+    avg_performance = total_performance / total_lessons if total_lessons > 0 else 0
 
     return {
         "period": period,
@@ -257,5 +298,5 @@ async def update_preferences(
         return {"message": "Preferences updated successfully"}
 
     except Exception as e:
-        logger.error(f"Error updating preferences: {e}")
+        logger.error("Error updating preferences: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
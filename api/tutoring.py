@@ -1,59 +1,196 @@
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, text
+from sqlalchemy.orm import joinedload
 from typing import Optional, Dict, Any, List
+from collections import deque
+from dataclasses import dataclass, field
 import json
+import orjson
 import uuid
 from datetime import datetime
 from models.student import Student
 from models.lesson import Lesson
 from models.interaction import Interaction
 from api.auth import get_current_user
-from services.claude_tutor import ClaudeTutor
+from services.claude_tutor import ClaudeTutor, get_claude_tutor
 from services.voice import ElevenLabsVoiceService
+from services.interaction_writer import record_interaction
 from utils.database import get_db
+from utils.cache import cache_get, cache_set
+import hashlib
 import logging
 import asyncio
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-claude_tutor = ClaudeTutor()
 voice_service = ElevenLabsVoiceService()
 
+# Practice prompts depend only on low-entropy inputs, so completions are shared
+PRACTICE_CACHE_TTL = 7 * 86400
+
+
+@dataclass(slots=True)
+class Connection:
+    """A live lesson's socket, outbound queue and session state."""
+    websocket: WebSocket
+    out_queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    writer_task: Optional[asyncio.Task] = None
+    conversation_history: List[Dict[str, Any]] = field(default_factory=list)
+    session_id: uuid.UUID = field(default_factory=uuid.uuid4)
+    start_time: datetime = field(default_factory=datetime.utcnow)
+    student_profile: Dict[str, Any] = field(default_factory=dict)
+    lesson_plan: Dict[str, Any] = field(default_factory=dict)
+
 
 class ConnectionManager:
     """Manage WebSocket connections for live tutoring."""
 
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.lesson_sessions: Dict[str, Dict[str, Any]] = {}
+        self.active_connections: Dict[str, Connection] = {}
+        # Read-only sockets (teacher, parent) following a lesson
+        self.observers: Dict[str, List[Connection]] = {}
 
     async def connect(self, websocket: WebSocket, lesson_id: str):
         await websocket.accept()
-        self.active_connections[lesson_id] = websocket
-        self.lesson_sessions[lesson_id] = {
-            "conversation_history": [],
-            "session_id": str(uuid.uuid4()),
-            "start_time": datetime.utcnow()
-        }
-
-    def disconnect(self, lesson_id: str):
-        if lesson_id in self.active_connections:
-            del self.active_connections[lesson_id]
-        if lesson_id in self.lesson_sessions:
-            del self.lesson_sessions[lesson_id]
+        connection = Connection(websocket)
+        connection.writer_task = asyncio.create_task(self._writer(lesson_id, connection))
+        self.active_connections[lesson_id] = connection
+
+    async def disconnect(self, lesson_id: str):
+        connection = self.active_connections.pop(lesson_id, None)
+        if connection:
+            # Let the writer flush what is already queued, then stop
+            connection.out_queue.put_nowait(None)
+            await connection.writer_task
 
     async def send_message(self, lesson_id: str, message: dict):
-        if lesson_id in self.active_connections:
-            await self.active_connections[lesson_id].send_json(message)
+        connection = self.active_connections.get(lesson_id)
+        if connection:
+            connection.out_queue.put_nowait(message)
 
-    def get_session(self, lesson_id: str) -> Optional[Dict[str, Any]]:
-        return self.lesson_sessions.get(lesson_id)
+    async def send_binary(self, lesson_id: str, data: bytes):
+        connection = self.active_connections.get(lesson_id)
+        if connection:
+            connection.out_queue.put_nowait(data)
+
+    async def add_observer(self, websocket: WebSocket, lesson_id: str) -> Connection:
+        await websocket.accept()
+        connection = Connection(websocket)
+        connection.writer_task = asyncio.create_task(self._writer(lesson_id, connection))
+        self.observers.setdefault(lesson_id, []).append(connection)
+        return connection
+
+    async def remove_observer(self, lesson_id: str, connection: Connection):
+        self._drop_observer(lesson_id, connection)
+        connection.out_queue.put_nowait(None)
+        await connection.writer_task
+
+    async def broadcast(self, lesson_id: str, message: Any):
+        """Send a message to the student and every observer, encoding it once."""
+        frame = message if isinstance(message, bytes) else orjson.dumps(message).decode()
+        student = self.active_connections.get(lesson_id)
+        if student:
+            student.out_queue.put_nowait(frame)
+        for observer in self.observers.get(lesson_id, ()):
+            observer.out_queue.put_nowait(frame)
+
+    def get_session(self, lesson_id: str) -> Optional[Connection]:
+        return self.active_connections.get(lesson_id)
+
+    def attach_context(
+        self,
+        lesson_id: str,
+        student_profile: Dict[str, Any],
+        lesson_plan: Dict[str, Any]
+    ):
+        """Keep the per-lesson prompt context on the session, built once."""
+        session = self.active_connections.get(lesson_id)
+        if session is not None:
+            session.student_profile = student_profile
+            session.lesson_plan = lesson_plan
+
+    async def _writer(self, lesson_id: str, connection: Connection):
+        """Send queued messages (JSON or raw bytes) in order, off the handlers' hot path."""
+        while True:
+            message = await connection.out_queue.get()
+            if message is None:
+                return
+            try:
+                if isinstance(message, bytes):
+                    await connection.websocket.send_bytes(message)
+                elif isinstance(message, str):
+                    # Already encoded by broadcast()
+                    await connection.websocket.send_text(message)
+                else:
+                    await connection.websocket.send_text(orjson.dumps(message).decode())
+            except Exception as e:
+                logger.warning(f"Dropping outbound messages for lesson {lesson_id}: {e}")
+                self._drop_observer(lesson_id, connection)
+                return
+
+    def _drop_observer(self, lesson_id: str, connection: Connection):
+        observers = self.observers.get(lesson_id)
+        if observers and connection in observers:
+            observers.remove(connection)
+            if not observers:
+                del self.observers[lesson_id]
 
 
 manager = ConnectionManager()
 
 
+async def receive_frame(websocket: WebSocket) -> Dict[str, Any]:
+    """Receive one JSON frame (text or binary), parsed with orjson."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    return orjson.loads(message.get("text") or message.get("bytes"))
+
+
+class InboundFrames:
+    """Frames read off a socket by a background task and buffered for the lesson loop."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.frames: deque = deque()
+        self.error: Optional[Exception] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._reader = asyncio.create_task(self._read())
+
+    def stop(self):
+        if self._reader:
+            self._reader.cancel()
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        """Wait for at least one frame and take everything buffered so far."""
+        while not self.frames:
+            if self.error:
+                raise self.error
+            self._waiter = asyncio.get_running_loop().create_future()
+            await self._waiter
+        batch = list(self.frames)
+        self.frames.clear()
+        return batch
+
+    async def _read(self):
+        try:
+            while True:
+                self.frames.append(await receive_frame(self.websocket))
+                self._wake()
+        except Exception as e:
+            # Surfaced to the lesson loop once the buffered frames are handled
+            self.error = e
+            self._wake()
+
+    def _wake(self):
+        if self._waiter and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
 @router.websocket("/live/{lesson_id}")
 async def live_tutoring_session(
     websocket: WebSocket,
@@ -62,24 +199,38 @@ async def live_tutoring_session(
 ):
     """WebSocket endpoint for live tutoring."""
     await manager.connect(websocket, lesson_id)
+    inbound = InboundFrames(websocket)
 
     try:
         # Get lesson and student
+        lesson_uuid = uuid.UUID(lesson_id)
         result = await db.execute(
-            select(Lesson).where(Lesson.id == uuid.UUID(lesson_id))
+            select(Lesson)
+            .options(joinedload(Lesson.student))
+            .where(Lesson.id == lesson_uuid)
         )
         lesson = result.scalar_one_or_none()
 
         if not lesson:
-            await websocket.send_json({"error": "Lesson not found"})
+            await websocket.send_text(orjson.dumps({"error": "Lesson not found"}).decode())
             await websocket.close()
             return
 
-        # Get student profile
-        student_result = await db.execute(
-            select(Student).where(Student.id == lesson.student_id)
+        # Student profile came with the lesson
+        student = lesson.student
+
+        # The tutor's context is fixed for the lesson, so build it once
+        manager.attach_context(
+            lesson_id,
+            student_profile={
+                "full_name": student.full_name,
+                "english_level": student.english_level,
+                "learning_style": student.learning_style,
+                "weak_areas": student.weak_areas or [],
+                "interests": student.interests or []
+            },
+            lesson_plan=lesson.lesson_plan or {}
         )
-        student = student_result.scalar_one_or_none()
 
         # Send initial greeting
         await manager.send_message(lesson_id, {
@@ -87,21 +238,34 @@ async def live_tutoring_session(
             "message": f"Welcome to your lesson, {student.full_name}! Today we'll be working on {lesson.topic}."
         })
 
-        # Main message loop
-        while True:
-            # Receive message from student
-            data = await websocket.receive_json()
-
-            if data["type"] == "end_session":
-                break
-
-            if data["type"] == "message":
+        # Main message loop; frames keep being read while a reply is generated
+        inbound.start()
+        session_ended = False
+        while not session_ended:
+            # Text sent while the tutor was busy is answered as one message
+            pending: List[str] = []
+            for data in await inbound.next_batch():
+                if data["type"] == "message":
+                    pending.append(data["content"])
+                    continue
+
+                if pending:
+                    await handle_student_message(
+                        lesson_id, lesson, student, "\n".join(pending), db
+                    )
+                    pending = []
+
+                if data["type"] == "end_session":
+                    session_ended = True
+                    break
+                if data["type"] == "voice":
+                    await handle_voice_message(
+                        lesson_id, lesson, student, data["audio"], db
+                    )
+
+            if pending:
                 await handle_student_message(
-                    lesson_id, lesson, student, data["content"], db
-                )
-            elif data["type"] == "voice":
-                await handle_voice_message(
-                    lesson_id, lesson, student, data["audio"], db
+                    lesson_id, lesson, student, "\n".join(pending), db
                 )
 
     except WebSocketDisconnect:
@@ -113,7 +277,8 @@ async def live_tutoring_session(
             "message": "An error occurred. Please try reconnecting."
         })
     finally:
-        manager.disconnect(lesson_id)
+        inbound.stop()
+        await manager.disconnect(lesson_id)
 
 
 async def handle_student_message(
@@ -130,62 +295,56 @@ async def handle_student_message(
 
     try:
         # Add to conversation history
-        session["conversation_history"].append({
+        session.conversation_history.append({
             "role": "user",
             "content": message,
             "timestamp": datetime.utcnow().isoformat()
         })
 
+        # Voice the reply while it is still being generated, if enabled
+        voice = None
+        if student.preferred_lesson_times and "voice_enabled" in student.preferred_lesson_times:
+            voice = SentenceVoice(lesson_id)
+
         # Get AI response
-        student_profile = {
-            "full_name": student.full_name,
-            "english_level": student.english_level,
-            "learning_style": student.learning_style,
-            "weak_areas": student.weak_areas or [],
-            "interests": student.interests or []
-        }
-
-        response_data = await claude_tutor.conduct_lesson(
-            student_profile=student_profile,
-            lesson_plan=lesson.lesson_plan or {},
-            conversation_history=session["conversation_history"],
-            user_message=message
+        response_data = await get_claude_tutor().conduct_lesson(
+            student_profile=session.student_profile,
+            lesson_plan=session.lesson_plan,
+            conversation_history=session.conversation_history,
+            user_message=message,
+            on_sentence=voice.add if voice else None
         )
 
         ai_response = response_data["response"]
         analysis = response_data["analysis"]
 
         # Send AI response
-        await manager.send_message(lesson_id, {
+        await manager.broadcast(lesson_id, {
             "type": "ai_message",
             "content": ai_response,
             "analysis": analysis
         })
 
         # Add to conversation history
-        session["conversation_history"].append({
+        session.conversation_history.append({
             "role": "ai",
             "content": ai_response,
             "timestamp": datetime.utcnow().isoformat()
         })
+        # Only the recent window is ever sent, so don't keep the rest around
+        get_claude_tutor().prune_history(session.conversation_history)
 
-        # Save interaction to database
-        interaction = Interaction(
+        # Save interaction to database in the background
+        record_interaction(Interaction(
             student_id=student.id,
             lesson_id=lesson.id,
             interaction_type="conversation",
-            session_id=uuid.UUID(session["session_id"]),
+            session_id=session.session_id,
             student_message=message,
             ai_response=ai_response,
             detected_errors=analysis.get("corrections_made"),
             topic_keywords=analysis.get("keywords", [])
-        )
-        db.add(interaction)
-        await db.commit()
-
-        # Generate voice response if enabled
-        if student.preferred_lesson_times and "voice_enabled" in student.preferred_lesson_times:
-            asyncio.create_task(send_voice_response(lesson_id, ai_response))
+        ))
 
     except Exception as e:
         logger.error(f"Error handling message: {e}")
@@ -195,19 +354,47 @@ async def handle_student_message(
         })
 
 
-async def send_voice_response(lesson_id: str, text: str):
-    """Send voice response for AI message."""
-    try:
-        # Generate voice
-        audio_data = await voice_service.text_to_speech(text)
+class SentenceVoice:
+    """Voice a streamed reply sentence by sentence, keeping the audio in order."""
 
-        # Send audio to client
-        await manager.send_message(lesson_id, {
+    def __init__(self, lesson_id: str):
+        self.lesson_id = lesson_id
+        self.sequence = 0
+        self._last_send: Optional[asyncio.Task] = None
+
+    def add(self, sentence: str):
+        # Sentences are synthesised concurrently; sends are chained to keep their order
+        synthesis = asyncio.create_task(voice_service.text_to_speech(sentence))
+        self._last_send = asyncio.create_task(
+            self._send(self.sequence, synthesis, self._last_send)
+        )
+        self.sequence += 1
+
+    async def _send(
+        self,
+        sequence: int,
+        synthesis: asyncio.Task,
+        previous: Optional[asyncio.Task]
+    ):
+        try:
+            audio_data = await synthesis
+        except Exception as e:
+            logger.error(f"Error generating voice: {e}")
+            audio_data = None
+
+        if previous:
+            await previous
+        if audio_data is None:
+            return
+
+        # Announce the audio, then send it as a raw binary frame right after
+        await manager.broadcast(self.lesson_id, {
             "type": "ai_voice",
-            "audio": audio_data.hex()  # Convert bytes to hex string
+            "sequence": sequence,
+            "format": "audio/mpeg",
+            "length": len(audio_data)
         })
-    except Exception as e:
-        logger.error(f"Error generating voice: {e}")
+        await manager.broadcast(self.lesson_id, audio_data)
 
 
 async def handle_voice_message(
@@ -226,10 +413,46 @@ async def handle_voice_message(
     })
 
 
+def practice_cache_key(namespace: str, key_fields: Dict[str, Any]) -> str:
+    """Cache key for practice content, insensitive to case and stray whitespace."""
+    canonical = {
+        name: value.strip().lower() if isinstance(value, str) else value
+        for name, value in key_fields.items()
+    }
+    fingerprint = json.dumps(canonical, sort_keys=True)
+    return f"practice:{namespace}:" + hashlib.sha1(fingerprint.encode()).hexdigest()
+
+
+async def cached_practice_completion(
+    claude_tutor: ClaudeTutor,
+    namespace: str,
+    key_fields: Dict[str, Any],
+    prompt: str,
+    max_tokens: int,
+    temperature: float
+) -> str:
+    """Get a practice completion, reusing one stored for the same inputs."""
+    cache_key = practice_cache_key(namespace, key_fields)
+
+    text = await cache_get(cache_key)
+    if text is None:
+        response = await claude_tutor.client.messages.create(
+            model=claude_tutor.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        text = response.content[0].text
+        await cache_set(cache_key, text, PRACTICE_CACHE_TTL)
+
+    return text
+
+
 @router.post("/practice/conversation")
 async def practice_conversation(
     practice_data: dict,
-    current_user: Student = Depends(get_current_user)
+    current_user: Student = Depends(get_current_user),
+    claude_tutor: ClaudeTutor = Depends(get_claude_tutor)
 ):
     """Start a practice conversation on a topic."""
     topic = practice_data["topic"]
@@ -241,16 +464,18 @@ Topic: {topic}
 Student Level: {difficulty}
 Format: A realistic scenario or question to start practicing."""
 
-    response = await claude_tutor.client.messages.create(
-        model=claude_tutor.model,
+    starter = await cached_practice_completion(
+        claude_tutor,
+        "conversation",
+        {"topic": topic, "difficulty": difficulty},
+        prompt,
         max_tokens=512,
-        temperature=0.8,
-        messages=[{"role": "user", "content": prompt}]
+        temperature=0.8
     )
 
     return {
         "topic": topic,
-        "starter": response.content[0].text,
+        "starter": starter,
         "suggested_vocabulary": ["example", "words"],  # Would be generated
         "grammar_focus": ["present perfect", "conditionals"]  # Would be generated
     }
@@ -259,34 +484,24 @@ Format: A realistic scenario or question to start practicing."""
 @router.post("/practice/grammar")
 async def practice_grammar(
     practice_data: dict,
-    current_user: Student = Depends(get_current_user)
+    current_user: Student = Depends(get_current_user),
+    claude_tutor: ClaudeTutor = Depends(get_claude_tutor)
 ):
     """Generate grammar practice exercises."""
     grammar_point = practice_data["grammar_point"]
     num_exercises = practice_data.get("num_exercises", 5)
 
-    exercises = []
-    for i in range(num_exercises):
-        # Generate exercise
-        prompt = f"""Create a grammar exercise for: {grammar_point}
-Student Level: {current_user.english_level}
-Exercise type: varied (fill-in-blank, correction, transformation)
-Include the answer."""
-
-        response = await claude_tutor.client.messages.create(
-            model=claude_tutor.model,
-            max_tokens=256,
-            temperature=0.7,
-            messages=[{"role": "user", "content": prompt}]
+    # One request for the whole set, shared by students at the same level
+    cache_key = practice_cache_key(
+        "grammar",
+        {"grammar_point": grammar_point, "level": current_user.english_level, "count": num_exercises}
+    )
+    exercises = await cache_get(cache_key)
+    if exercises is None:
+        exercises = await claude_tutor.generate_grammar_exercises(
+            grammar_point, current_user.english_level, num_exercises
         )
-
-        # Parse exercise (simplified)
-        exercises.append({
-            "type": "fill_blank",
-            "question": "Example question",
-            "answer": "correct answer",
-            "explanation": "Why this is correct"
-        })
+        await cache_set(cache_key, exercises, PRACTICE_CACHE_TTL)
 
     return {
         "grammar_point": grammar_point,
@@ -297,7 +512,8 @@ Include the answer."""
 @router.post("/assess")
 async def assess_response(
     assessment_data: dict,
-    current_user: Student = Depends(get_current_user)
+    current_user: Student = Depends(get_current_user),
+    claude_tutor: ClaudeTutor = Depends(get_claude_tutor)
 ):
     """Assess a student's response."""
     response = await claude_tutor.assess_student_response(
@@ -309,16 +525,44 @@ async def assess_response(
     return response
 
 
+# Error counts by type and distinct topics for one lesson, aggregated in Postgres.
+# Errors recorded as plain strings (no "type") count as "other".
+LESSON_FEEDBACK_ANALYSIS = text("""
+WITH lesson_interactions AS (
+    SELECT
+        CASE WHEN json_typeof(detected_errors) = 'array' THEN detected_errors ELSE '[]'::json END AS errors,
+        CASE WHEN json_typeof(topic_keywords) = 'array' THEN topic_keywords ELSE '[]'::json END AS keywords
+    FROM interactions
+    WHERE lesson_id = :lesson_id
+),
+error_types AS (
+    SELECT
+        CASE WHEN json_typeof(error) = 'object' THEN COALESCE(error->>'type', 'other') ELSE 'other' END AS error_type,
+        COUNT(*) AS occurrences
+    FROM lesson_interactions, json_array_elements(errors) AS error
+    GROUP BY 1
+)
+SELECT
+    (SELECT COUNT(*) FROM lesson_interactions) AS total_interactions,
+    (SELECT COALESCE(SUM(occurrences), 0)::bigint FROM error_types) AS total_errors,
+    (SELECT COALESCE(json_object_agg(error_type, occurrences), '{}'::json) FROM error_types) AS error_breakdown,
+    (
+        SELECT COALESCE(array_agg(DISTINCT keyword), '{}')
+        FROM lesson_interactions, json_array_elements_text(keywords) AS keyword
+    ) AS topics_covered
+""")
+
+
 @router.get("/feedback/{lesson_id}")
 async def get_lesson_feedback(
-    lesson_id: str,
+    lesson_id: uuid.UUID,
     current_user: Student = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """Get detailed feedback for a completed lesson."""
     result = await db.execute(
         select(Lesson).where(
-            Lesson.id == uuid.UUID(lesson_id),
+            Lesson.id == lesson_id,
             Lesson.student_id == current_user.id,
             Lesson.status == "completed"
         )
@@ -328,28 +572,9 @@ async def get_lesson_feedback(
     if not lesson:
         raise HTTPException(status_code=404, detail="Completed lesson not found")
 
-    # Get all interactions from the lesson
-    interactions_result = await db.execute(
-        select(Interaction).where(
-            Interaction.lesson_id == lesson.id
-        ).order_by(Interaction.timestamp)
-    )
-    interactions = interactions_result.scalars().all()
-
-    # Analyze interactions for detailed feedback
-    total_errors = 0
-    error_types = {}
-    topics_covered = set()
-
-    for interaction in interactions:
-        if interaction.detected_errors:
-            total_errors += len(interaction.detected_errors)
-            for error in interaction.detected_errors:
-                error_type = error.get("type", "other")
-                error_types[error_type] = error_types.get(error_type, 0) + 1
-
-        if interaction.topic_keywords:
-            topics_covered.update(interaction.topic_keywords)
+    # Summarise the lesson's interactions in the database
+    analysis_result = await db.execute(LESSON_FEEDBACK_ANALYSIS, {"lesson_id": lesson.id})
+    analysis = analysis_result.one()
 
     return {
         "lesson_id": lesson_id,
@@ -363,10 +588,10 @@ async def get_lesson_feedback(
             "vocabulary_usage": lesson.vocabulary_usage_score
         },
         "analysis": {
-            "total_interactions": len(interactions),
-            "total_errors": total_errors,
-            "error_breakdown": error_types,
-            "topics_covered": list(topics_covered)
+            "total_interactions": analysis.total_interactions,
+            "total_errors": analysis.total_errors,
+            "error_breakdown": analysis.error_breakdown,
+            "topics_covered": analysis.topics_covered
         },
         "recommendations": [
             "Focus on present perfect tense",
@@ -1,22 +1,29 @@
-from fastapi import APIRouter, Request, HTTPException, Header
+from fastapi import APIRouter, Depends, Request, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
 from typing import Optional
+from datetime import datetime
+from svix.webhooks import Webhook, WebhookVerificationError
 import stripe
 import json
-import hmac
-import hashlib
+import orjson
 from models.student import Student
 from utils.database import get_db
-from config import settings
+from config import CLERK_WEBHOOK_SECRET, STRIPE_SECRET_KEY, STRIPE_WEBHOOK_SECRET
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # Initialize Stripe
-if settings.STRIPE_SECRET_KEY:
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+if STRIPE_SECRET_KEY:
+    stripe.api_key = STRIPE_SECRET_KEY
+
+# Clerk delivers webhooks through Svix
+clerk_webhook_verifier = Webhook(CLERK_WEBHOOK_SECRET) if CLERK_WEBHOOK_SECRET else None
+
+CLERK_HANDLED_EVENTS = {"user.created", "user.updated", "user.deleted"}
 
 
 @router.post("/clerk")
@@ -28,57 +35,51 @@ async def clerk_webhook(
     db: AsyncSession = Depends(get_db)
 ):
     """Handle Clerk webhooks."""
-    try:
-        payload = await request.body()
-
-        # Verify webhook signature
-        if settings.CLERK_WEBHOOK_SECRET:
-            expected_sig = hmac.new(
-                settings.CLERK_WEBHOOK_SECRET.encode(),
-                payload,
-                hashlib.sha256
-            ).hexdigest()
+    payload = await request.body()
+
+    # Reject bad signatures before parsing or touching the database
+    if clerk_webhook_verifier:
+        try:
+            clerk_webhook_verifier.verify(payload, {
+                "svix-id": svix_id or "",
+                "svix-timestamp": svix_timestamp or "",
+                "svix-signature": svix_signature or ""
+            })
+        except WebhookVerificationError:
+            raise HTTPException(status_code=401, detail="Invalid signature")
 
-            # Compare signatures (simplified - Clerk uses Svix)
-            # In production, use Svix library for verification
-
-        data = json.loads(payload)
+    try:
+        data = orjson.loads(payload)
         event_type = data.get("type")
 
-        if event_type == "user.created":
-            # Create student record
+        if event_type not in CLERK_HANDLED_EVENTS:
+            return {"status": "ignored"}
+
+        if event_type in ("user.created", "user.updated"):
+            # Create or update the student record in one statement
             user_data = data["data"]
-            student = Student(
+            email = user_data["email_addresses"][0]["email_address"]
+            full_name = f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip()
+            stmt = insert(Student).values(
                 clerk_user_id=user_data["id"],
-                email=user_data["email_addresses"][0]["email_address"],
-                full_name=f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip()
+                email=email,
+                full_name=full_name
+            ).on_conflict_do_update(
+                index_elements=[Student.clerk_user_id],
+                set_={"email": email, "full_name": full_name, "updated_at": datetime.utcnow()}
             )
-            db.add(student)
+            await db.execute(stmt)
             await db.commit()
-            logger.info(f"Created student record for {student.email}")
-
-        elif event_type == "user.updated":
-            # Update student record
-            user_data = data["data"]
-            result = await db.execute(
-                select(Student).where(Student.clerk_user_id == user_data["id"])
-            )
-            student = result.scalar_one_or_none()
-            if student:
-                student.email = user_data["email_addresses"][0]["email_address"]
-                student.full_name = f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip()
-                await db.commit()
+            logger.info(f"Upserted student record for {email}")
 
         elif event_type == "user.deleted":
             # Handle user deletion
-            user_id = data["data"]["id"]
-            result = await db.execute(
-                select(Student).where(Student.clerk_user_id == user_id)
+            await db.execute(
+                update(Student)
+                .where(Student.clerk_user_id == data["data"]["id"])
+                .values(is_active=False)
             )
-            student = result.scalar_one_or_none()
-            if student:
-                student.is_active = False
-                await db.commit()
+            await db.commit()
 
         return {"status": "success"}
 
@@ -98,73 +99,72 @@ async def stripe_webhook(
         payload = await request.body()
 
         # Verify webhook signature
-        if settings.STRIPE_WEBHOOK_SECRET:
+        if STRIPE_WEBHOOK_SECRET:
             event = stripe.Webhook.construct_event(
                 payload,
                 stripe_signature,
-                settings.STRIPE_WEBHOOK_SECRET
+                STRIPE_WEBHOOK_SECRET
             )
         else:
             data = json.loads(payload)
             event = stripe.Event.construct_from(data, stripe.api_key)
 
-        # Handle different event types
+        # Handle different event types, each a single UPDATE ... RETURNING
         if event.type == "checkout.session.completed":
             session = event.data.object
 
             # Find student by email
             result = await db.execute(
-                select(Student).where(Student.email == session.customer_email)
+                update(Student)
+                .where(Student.email == session.customer_email)
+                .values(subscription_status="active", stripe_customer_id=session.customer)
+                .returning(Student.email)
             )
-            student = result.scalar_one_or_none()
-
-            if student:
-                student.subscription_status = "active"
-                student.stripe_customer_id = session.customer
-                await db.commit()
-                logger.info(f"Subscription activated for {student.email}")
+            email = result.scalar_one_or_none()
+            await db.commit()
+            if email:
+                logger.info(f"Subscription activated for {email}")
 
         elif event.type == "customer.subscription.updated":
             subscription = event.data.object
 
             # Find student by Stripe customer ID
-            result = await db.execute(
-                select(Student).where(Student.stripe_customer_id == subscription.customer)
+            await db.execute(
+                update(Student)
+                .where(Student.stripe_customer_id == subscription.customer)
+                .values(
+                    subscription_status=subscription.status,
+                    subscription_plan=subscription.items.data[0].price.nickname
+                )
             )
-            student = result.scalar_one_or_none()
-
-            if student:
-                student.subscription_status = subscription.status
-                student.subscription_plan = subscription.items.data[0].price.nickname
-                await db.commit()
+            await db.commit()
 
         elif event.type == "customer.subscription.deleted":
             subscription = event.data.object
 
             # Find student by Stripe customer ID
             result = await db.execute(
-                select(Student).where(Student.stripe_customer_id == subscription.customer)
+                update(Student)
+                .where(Student.stripe_customer_id == subscription.customer)
+                .values(subscription_status="canceled")
+                .returning(Student.email)
             )
-            student = result.scalar_one_or_none()
-
-            if student:
-                student.subscription_status = "canceled"
-                await db.commit()
-                logger.info(f"Subscription canceled for {student.email}")
+            email = result.scalar_one_or_none()
+            await db.commit()
+            if email:
+                logger.info(f"Subscription canceled for {email}")
 
         elif event.type == "invoice.payment_failed":
             invoice = event.data.object
 
             # Handle failed payment
-            result = await db.execute(
-                select(Student).where(Student.stripe_customer_id == invoice.customer)
+            await db.execute(
+                update(Student)
+                .where(Student.stripe_customer_id == invoice.customer)
+                .values(subscription_status="past_due")
             )
-            student = result.scalar_one_or_none()
-
-            if student:
-                student.subscription_status = "past_due"
-                await db.commit()
-                # TODO: Send notification to student
+            await db.commit()
+            # TODO: Send notification to student
 
         return {"status": "success"}
 
@@ -1,9 +1,66 @@
 import os
+import time
+import asyncio
 import jwt
+import httpx
 from fastapi import HTTPException, Header
+from functools import lru_cache
 from typing import Optional
+from utils.http import get_http_client
 
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL", "https://api.clerk.com/v1/jwks")
+# Frontend API URL tokens must be issued by, e.g. https://clerk.example.com; unchecked when unset
+CLERK_ISSUER = os.getenv("CLERK_ISSUER")
+
+# Clerk's public signing keys by kid, refreshed hourly or when an unknown kid shows up
+JWKS_REFRESH_SECONDS = 3600
+JWKS_MIN_REFETCH_SECONDS = 30
+_signing_keys: dict = {}
+_signing_keys_fetched_at = 0.0
+_signing_keys_lock = asyncio.Lock()
+
+
+async def get_signing_key(kid: Optional[str]):
+    """Public key for a token's kid, from the cached Clerk JWKS."""
+    global _signing_keys, _signing_keys_fetched_at
+
+    age = time.monotonic() - _signing_keys_fetched_at
+    if age < JWKS_REFRESH_SECONDS and (kid in _signing_keys or age < JWKS_MIN_REFETCH_SECONDS):
+        return _signing_keys.get(kid)
+
+    async with _signing_keys_lock:
+        # Another request may have refreshed the keys while we waited
+        if time.monotonic() - _signing_keys_fetched_at >= JWKS_MIN_REFETCH_SECONDS:
+            # Stamp the attempt up front so a failing JWKS endpoint is only retried every JWKS_MIN_REFETCH_SECONDS
+            _signing_keys_fetched_at = time.monotonic()
+            try:
+                response = await get_http_client().get(
+                    CLERK_JWKS_URL,
+                    headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"}
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                if not _signing_keys:
+                    raise HTTPException(status_code=503, detail=f"Could not fetch signing keys: {e}")
+            else:
+                _signing_keys = {
+                    jwk["kid"]: jwt.PyJWK(jwk).key for jwk in response.json()["keys"]
+                }
+
+    return _signing_keys.get(kid)
+
+
+@lru_cache(maxsize=1024)
+def decode_token(token: str, kid: str) -> dict:
+    """Verify a token's RS256 signature; repeat calls for the same token skip the crypto."""
+    return jwt.decode(
+        token,
+        _signing_keys[kid],
+        algorithms=["RS256"],
+        issuer=CLERK_ISSUER,
+        options={"verify_exp": False, "verify_iss": CLERK_ISSUER is not None}
+    )
 
 
 async def verify_token(authorization: Optional[str] = Header(None)) -> dict:
@@ -33,13 +90,15 @@ async def verify_token(authorization: Optional[str] = Header(None)) -> dict:
         raise HTTPException(status_code=500, detail="Clerk secret key not configured")
 
     try:
-        # Decode JWT token
-        payload = jwt.decode(
-            token,
-            CLERK_SECRET_KEY,
-            algorithms=["RS256"],
-            options={"verify_signature": True}
-        )
+        # Verify against Clerk's published key for this token
+        kid = jwt.get_unverified_header(token).get("kid")
+        if await get_signing_key(kid) is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        payload = decode_token(token, kid)
+
+        # Expiry is checked here so it still applies to cached decodes
+        if payload.get("exp", 0) <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
 
         return {
             "user_id": payload.get("sub"),
@@ -1,6 +1,6 @@
 import os
 from typing import Optional
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 
 
@@ -8,6 +8,9 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
     DATABASE_URL_POOLED: Optional[str] = None
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_RECYCLE_SECONDS: int = 1800
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -53,6 +56,7 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "text-embedding-3-small"
     MAX_TOKENS: int = 4096
     TEMPERATURE: float = 0.7
+    MAX_HISTORY_TOKENS: int = 4000
 
     # Application Settings
     MAX_LESSON_DURATION_MINUTES: int = 60
@@ -60,9 +64,7 @@ class Settings(BaseSettings):
     ADVANCE_SCHEDULING_DAYS: int = 30
     PLACEMENT_TEST_QUESTIONS: int = 20
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True, frozen=True)
 
 
 @lru_cache()
@@ -70,4 +72,9 @@ def get_settings() -> Settings:
     return Settings()
 
 
-settings = get_settings()
\ No newline at end of file
+settings = get_settings()
+
+# Read once; hot paths import these instead of going through settings
+CLERK_WEBHOOK_SECRET = settings.CLERK_WEBHOOK_SECRET
+STRIPE_SECRET_KEY = settings.STRIPE_SECRET_KEY
+STRIPE_WEBHOOK_SECRET = settings.STRIPE_WEBHOOK_SECRET
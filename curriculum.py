@@ -3,6 +3,9 @@ Cultura Builder 18-Month Curriculum
 Structured learning path from AI beginner to launching applications
 """
 
+import bisect
+from types import MappingProxyType
+
 CURRICULUM = {
     "levels": [
         {
@@ -399,19 +402,61 @@ CURRICULUM = {
 }
 
 
-def get_curriculum():
-    """Return full curriculum structure"""
+
+def _freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+# Shared by every request, so make it read-only rather than trusting callers not to mutate it
+CURRICULUM = _freeze(CURRICULUM)
+
+# CURRICULUM doesn't change after import, so index the levels once
+_LEVELS_BY_NUMBER = {level["level"]: level for level in CURRICULUM["levels"]}
+
+# Each level's lessons flattened in order as (module title, lesson) pairs
+_LESSONS_BY_LEVEL = {
+    level["level"]: tuple(
+        (module["title"], lesson)
+        for module in level.get("modules", ())
+        for lesson in module.get("lessons", ())
+    )
+    for level in CURRICULUM["levels"]
+}
+
+# Placement bands parsed from "0-30%" style keys into (inclusive upper %, label), ascending
+_SCORING = sorted(
+    (int(band.split("-")[1].rstrip("%")), label)
+    for band, label in CURRICULUM["assessment_system"]["placement_test"]["scoring"].items()
+)
+PLACEMENT_UPPER_BOUNDS = tuple(upper for upper, _ in _SCORING)
+
+
+def get_curriculum() -> MappingProxyType:
+    """Return full curriculum structure (read-only)"""
     return CURRICULUM
 
 
 def get_level(level_number: int):
     """Get specific level details"""
-    for level in CURRICULUM["levels"]:
-        if level["level"] == level_number:
-            return level
-    return None
+    return _LEVELS_BY_NUMBER.get(level_number)
+
+
+def get_flat_lessons(level_number: int):
+    """Get a level's lessons in order as (module title, lesson) pairs"""
+    return _LESSONS_BY_LEVEL.get(level_number, ())
 
 
 def get_placement_test():
     """Get placement test structure"""
     return CURRICULUM["assessment_system"]["placement_test"]
+
+
+def score_to_level(percentage: float) -> str:
+    """Placement band label for a test score percentage"""
+    index = min(bisect.bisect_left(PLACEMENT_UPPER_BOUNDS, percentage), len(_SCORING) - 1)
+    return _SCORING[index][1]
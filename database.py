@@ -1,8 +1,10 @@
 import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, String, Integer, DateTime, JSON, ForeignKey, UUID, Date, Text
+from sqlalchemy import Column, String, Integer, DateTime, JSON, ForeignKey, UUID, Date, Text, Index, UniqueConstraint
 from sqlalchemy.sql import func
+from sqlalchemy.dialects import postgresql, sqlite
+import time
 import uuid
 
 # Database URL from environment
@@ -14,10 +16,25 @@ if DATABASE_URL.startswith("postgres://"):
 elif DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
+# SQL logging is opt-in; it stringifies every statement and slows local load tests
+SQL_ECHO = os.getenv("SQL_ECHO") == "1"
+
+if DATABASE_URL.startswith("postgresql+asyncpg://"):
+    engine_options = {
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_pre_ping": True,
+        # Keep prepared statements per connection so repeat queries skip the prepare round-trip
+        "connect_args": {"prepared_statement_cache_size": 256, "statement_cache_size": 256},
+    }
+else:
+    engine_options = {}
+
 # Create async engine
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True if os.getenv("ENVIRONMENT") == "development" else False,
+    echo=SQL_ECHO,
+    **engine_options,
 )
 
 # Create async session factory
@@ -30,12 +47,23 @@ AsyncSessionLocal = sessionmaker(
 # Base class for models
 Base = declarative_base()
 
+def uuid7() -> uuid.UUID:
+    """Time-ordered UUID (RFC 9562 v7) so new rows land on the right-most index page."""
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | (0x7 << 76)  # version 7
+    value = value & ~(0x3 << 62) | (0x2 << 62)  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+
+# Binary JSON on Postgres (no reparse per read, GIN-indexable); plain JSON on SQLite
+JSONDocument = JSON().with_variant(postgresql.JSONB(), "postgresql")
+
 
 # Models
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     clerk_id = Column(String(255), unique=True, nullable=False, index=True)
     email = Column(String(255), unique=True, nullable=False, index=True)
     name = Column(String(255))
@@ -46,33 +74,47 @@ class User(Base):
 class UserProgress(Base):
     __tablename__ = "user_progress"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), unique=True, index=True)
     current_level = Column(Integer, default=0)
     current_module = Column(Integer, default=0)
     current_lesson = Column(Integer, default=1)
-    completed_lessons = Column(JSON, default=list)
+    # Denormalized count of CompletedLesson rows, bumped when a new one is inserted
     total_lessons_completed = Column(Integer, default=0)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
+class CompletedLesson(Base):
+    __tablename__ = "completed_lessons"
+
+    # The PK's (user_id, level) prefix serves "lessons done in level N" lookups
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    level = Column(Integer, primary_key=True)
+    module = Column(Integer, primary_key=True)
+    lesson = Column(Integer, primary_key=True)
+    completed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
     level = Column(Integer, nullable=False)
     lesson_number = Column(Integer, nullable=False)
-    messages = Column(JSON, nullable=False)
+    messages = Column(JSONDocument, nullable=False)
     duration_seconds = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
+    # "This user's recent conversations" as one index range scan
+    __table_args__ = (Index("ix_conv_user_created", "user_id", created_at.desc()),)
+
 
 class StudentQuestion(Base):
     __tablename__ = "student_questions"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), index=True, nullable=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     student_level = Column(String(50))
     lesson_number = Column(Integer)
@@ -81,27 +123,39 @@ class StudentQuestion(Base):
     module = Column(String(255))
     lesson_name = Column(String(255))
 
+    __table_args__ = (Index("ix_questions_user_timestamp", "user_id", timestamp.desc()),)
+
 
 class Achievement(Base):
     __tablename__ = "achievements"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
     achievement_type = Column(String(50), nullable=False)
     level_earned = Column(Integer)
     earned_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # One award per user/type/level; its user_id prefix also serves per-user lookups
+    __table_args__ = (UniqueConstraint("user_id", "achievement_type", "level_earned", name="uq_achievement_user_type_level"),)
+
 
 class LearningStreak(Base):
     __tablename__ = "learning_streaks"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), unique=True, index=True)
     current_streak = Column(Integer, default=0)
     longest_streak = Column(Integer, default=0)
     last_activity_date = Column(Date, server_default=func.current_date())
 
 
+def upsert(model):
+    """INSERT statement for the active dialect, supporting ON CONFLICT."""
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
 # Database dependency
 async def get_db():
     async with AsyncSessionLocal() as session:
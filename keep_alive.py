@@ -1,16 +1,19 @@
 """
-Keep Render free tier backend alive by pinging it every 10 minutes.
-Run this script on a free service like GitHub Actions, Render Cron, or your local machine.
+Keep Render free tier backend alive by pinging it once per run.
+Schedule it every 10 minutes (see .github/workflows/keepalive.yml, or a Render Cron Job)
+instead of keeping a process sleeping in a loop.
 """
 
-import requests
-import time
+import httpx
 
 BACKEND_URL = "https://tutoria-ia-backend.onrender.com/health"
 
+# Same client stack as the backend; reuses the connection if pinged more than once per run
+client = httpx.Client(http2=True, timeout=30)
+
 def ping_backend():
     try:
-        response = requests.get(BACKEND_URL, timeout=30)
+        response = client.get(BACKEND_URL)
         if response.status_code == 200:
             print(f"✅ Backend is alive! Status: {response.json()}")
         else:
@@ -19,6 +22,4 @@ def ping_backend():
         print(f"❌ Error pinging backend: {e}")
 
 if __name__ == "__main__":
-    while True:
-        ping_backend()
-        time.sleep(600)  # Wait 10 minutes
+    ping_backend()
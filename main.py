@@ -1,11 +1,27 @@
-from fastapi import FastAPI, Body, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Body, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
 from typing import Optional
 import os
+import gzip
 import json
+import orjson
 import asyncio
+import bisect
+import logging
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from dotenv import load_dotenv
-from curriculum import get_curriculum, get_level, get_placement_test
+from analytics import get_analytics_db, close_analytics_db, record_question, start_question_writer, stop_question_writer
+from prompts import PROFESSOR_PEDRO_SYSTEM
+from curriculum import get_curriculum, get_level, get_flat_lessons, get_placement_test, score_to_level, PLACEMENT_UPPER_BOUNDS
+from utils.audio_cache import audio_cache_key, audio_cache_stats, get_audio, put_audio
+from utils.compression import SelectiveGZipMiddleware
+from utils.http import close_http_client, get_http_client
+from utils.log_queue import start_log_listener, stop_log_listener
 
 # Phase 3: Database and Auth
 try:
@@ -19,11 +35,48 @@ except ImportError:
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# One client for the process so Claude calls reuse its connection pool;
+# HTTP/2 lets concurrent turns share connections to api.anthropic.com
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+anthropic_client: Optional[AsyncAnthropic] = AsyncAnthropic(
+    api_key=ANTHROPIC_API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    ),
+) if ANTHROPIC_API_KEY else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Manage application lifecycle."""
+    start_log_listener()
+    # Phase 3: Initialize database on startup
+    if PHASE_3_ENABLED:
+        await init_db()
+        print("✅ Database initialized")
+    await get_analytics_db()
+    start_question_writer()
+    if anthropic_client is None:
+        print("⚠️ ANTHROPIC_API_KEY not set, tutoring endpoints are disabled")
+    yield
+    if anthropic_client is not None:
+        await anthropic_client.close()
+    await stop_question_writer()
+    await close_analytics_db()
+    await close_http_client()
+    stop_log_listener()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Tutor Platform API",
     description="Backend API for AI-powered tutoring platform",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS
@@ -34,28 +87,38 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# SSE and MP3 responses are passed through uncompressed so they stream as they're produced
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=512)
 
-# Phase 3: Initialize database on startup
-if PHASE_3_ENABLED:
-    @app.on_event("startup")
-    async def startup():
-        await init_db()
-        print("✅ Database initialized")
+SSE_HEADERS = {"Cache-Control": "no-cache"}
 
-    # Include Progress API routes
+# Phase 3: Include Progress API routes
+if PHASE_3_ENABLED:
     app.include_router(progress_router)
 
+# Root and health bodies only depend on startup config, so encode them once
+ROOT_BODY = orjson.dumps({
+    "message": "AI Tutor Platform API - Tutoria IA",
+    "status": "online",
+    "documentation": "/docs",
+    "health": "/health",
+    "version": "1.0.0"
+})
+
+HEALTH_BODY = orjson.dumps({
+    "status": "healthy",
+    "environment": os.getenv("ENVIRONMENT", "production"),
+    "version": "1.0.0",
+    "anthropic_configured": anthropic_client is not None,
+    "elevenlabs_configured": bool(os.getenv("ELEVENLABS_API_KEY"))
+})
+
+
 # Health check endpoint
 @app.get("/")
 async def root():
     """Root endpoint."""
-    return {
-        "message": "AI Tutor Platform API - Tutoria IA",
-        "status": "online",
-        "documentation": "/docs",
-        "health": "/health",
-        "version": "1.0.0"
-    }
+    return Response(content=ROOT_BODY, media_type="application/json")
 
 @app.get("/api/analytics/questions")
 async def get_all_questions(
@@ -63,41 +126,23 @@ async def get_all_questions(
     level: Optional[str] = None
 ):
     """Get all student questions for analytics."""
-    import sqlite3
-
-    conn = sqlite3.connect('tutoria_analytics.db')
-    cursor = conn.cursor()
-
-    # Create table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS student_questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            student_level TEXT,
-            lesson_number INTEGER,
-            question TEXT NOT NULL,
-            response TEXT NOT NULL,
-            module TEXT,
-            lesson_name TEXT
-        )
-    ''')
+    db = await get_analytics_db()
 
     if level:
-        cursor.execute('''
+        async with db.execute('''
             SELECT * FROM student_questions
             WHERE student_level = ?
             ORDER BY timestamp DESC
             LIMIT ?
-        ''', (level, limit))
+        ''', (level, limit)) as cursor:
+            rows = await cursor.fetchall()
     else:
-        cursor.execute('''
+        async with db.execute('''
             SELECT * FROM student_questions
             ORDER BY timestamp DESC
             LIMIT ?
-        ''', (limit,))
-
-    rows = cursor.fetchall()
-    conn.close()
+        ''', (limit,)) as cursor:
+            rows = await cursor.fetchall()
 
     questions = []
     for row in rows:
@@ -117,48 +162,29 @@ async def get_all_questions(
 @app.get("/api/analytics/stats")
 async def get_stats():
     """Get overall statistics."""
-    import sqlite3
-
-    conn = sqlite3.connect('tutoria_analytics.db')
-    cursor = conn.cursor()
-
-    # Create table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS student_questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            student_level TEXT,
-            lesson_number INTEGER,
-            question TEXT NOT NULL,
-            response TEXT NOT NULL,
-            module TEXT,
-            lesson_name TEXT
-        )
-    ''')
+    db = await get_analytics_db()
 
     # Total questions
-    cursor.execute('SELECT COUNT(*) FROM student_questions')
-    total = cursor.fetchone()[0]
+    async with db.execute('SELECT COUNT(*) FROM student_questions') as cursor:
+        total = (await cursor.fetchone())[0]
 
     # Questions by level
-    cursor.execute('''
+    async with db.execute('''
         SELECT student_level, COUNT(*)
         FROM student_questions
         GROUP BY student_level
-    ''')
-    by_level = {row[0]: row[1] for row in cursor.fetchall()}
+    ''') as cursor:
+        by_level = {row[0]: row[1] for row in await cursor.fetchall()}
 
     # Most common topics (by module)
-    cursor.execute('''
+    async with db.execute('''
         SELECT module, COUNT(*) as count
         FROM student_questions
         GROUP BY module
         ORDER BY count DESC
         LIMIT 10
-    ''')
-    top_topics = [{"module": row[0], "count": row[1]} for row in cursor.fetchall()]
-
-    conn.close()
+    ''') as cursor:
+        top_topics = [{"module": row[0], "count": row[1]} for row in await cursor.fetchall()]
 
     return {
         "total_questions": total,
@@ -169,24 +195,43 @@ async def get_stats():
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring."""
-    elevenlabs_key = os.getenv("ELEVENLABS_API_KEY", "")
-    return {
-        "status": "healthy",
-        "environment": os.getenv("ENVIRONMENT", "production"),
-        "version": "1.0.0",
-        "anthropic_configured": bool(os.getenv("ANTHROPIC_API_KEY")),
-        "elevenlabs_configured": bool(elevenlabs_key),
-        "elevenlabs_key_preview": f"{elevenlabs_key[:8]}...{elevenlabs_key[-4:]}" if elevenlabs_key else "NOT_SET"
-    }
+    return Response(content=HEALTH_BODY, media_type="application/json")
+
+
+class VoiceRequest(BaseModel):
+    text: str
+    voice_id: Optional[str] = "EXAVITQu4vr4xnSDxMaL"
+
+
+class ChatRequest(BaseModel):
+    message: str
+    conversation_history: list = []
+    student_level: Optional[str] = "0"
+    lesson_number: Optional[int] = 1
+    stream: bool = False
+
+
+# ElevenLabs synthesis can take a while for longer texts
+VOICE_TIMEOUT = 30.0
+
+# Concurrent calls allowed per upstream; extra requests wait briefly, then get a 503
+TTS_SEMAPHORE = asyncio.Semaphore(8)
+LLM_SEMAPHORE = asyncio.Semaphore(4)
+UPSTREAM_WAIT_SECONDS = 10.0
+
+
+async def acquire_upstream(semaphore: asyncio.Semaphore):
+    """Take an upstream slot, or fail with 503 instead of queueing without bound."""
+    try:
+        await asyncio.wait_for(semaphore.acquire(), UPSTREAM_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Service busy, try again shortly", headers={"Retry-After": "5"})
 
 # Voice generation endpoint
 @app.post("/api/voice/generate")
-async def generate_voice(
-    text: str = Body(..., embed=True),
-    voice_id: Optional[str] = Body("EXAVITQu4vr4xnSDxMaL", embed=True)
-):
+async def generate_voice(body: VoiceRequest):
     """Generate voice using ElevenLabs API."""
-    import httpx
+    text, voice_id = body.text, body.voice_id
 
     elevenlabs_key = os.getenv("ELEVENLABS_API_KEY")
     if not elevenlabs_key:
@@ -214,34 +259,68 @@ async def generate_voice(
         }
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=data, headers=headers, timeout=30.0)
+    cache_key = audio_cache_key(voice_id, data["model_id"], data["voice_settings"], data["text"])
+    cached = get_audio(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="audio/mpeg")
 
-        if response.status_code == 200:
-            from fastapi.responses import Response
-            return Response(content=response.content, media_type="audio/mpeg")
-        else:
-            return {"error": f"ElevenLabs API error: {response.status_code}"}
+    # Pipe the MP3 through as ElevenLabs produces it instead of buffering the whole clip
+    http = get_http_client()
+    request = http.build_request("POST", url, json=data, headers=headers, timeout=VOICE_TIMEOUT)
+    # The slot is held until the stream finishes, since ElevenLabs is still generating
+    await acquire_upstream(TTS_SEMAPHORE)
+    try:
+        response = await http.send(request, stream=True)
+    except Exception:
+        TTS_SEMAPHORE.release()
+        raise
+
+    released = False
+
+    async def close_upstream():
+        nonlocal released
+        if released:
+            return
+        released = True
+        try:
+            await response.aclose()
+        finally:
+            TTS_SEMAPHORE.release()
 
-# Claude conversational tutor endpoint
-@app.post("/api/tutoring/chat")
-async def chat(
-    message: str = Body(..., embed=True),
-    conversation_history: list = Body([], embed=True),
-    student_level: Optional[str] = Body("0", embed=True),
-    lesson_number: Optional[int] = Body(1, embed=True)
-):
-    """Chat with Professor Caio - Conversational AI tutor with personality."""
-    from anthropic import Anthropic
+    async def stream_and_cache():
+        # Release here rather than in a background task: StreamingResponse skips
+        # background tasks when the body raises (e.g. an upstream read timeout)
+        try:
+            chunks = []
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                yield chunk
+            # Only complete clips are cached
+            put_audio(cache_key, b"".join(chunks))
+        finally:
+            await close_upstream()
+
+    if response.status_code == 200:
+        return StreamingResponse(
+            stream_and_cache(),
+            media_type="audio/mpeg",
+        )
+    else:
+        await close_upstream()
+        return {"error": f"ElevenLabs API error: {response.status_code}"}
 
-    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-    if not anthropic_key:
-        return {"error": "Anthropic API key not configured"}
+@app.get("/api/voice/cache/stats")
+async def voice_cache_stats():
+    """Hit rate and size of the synthesised audio cache."""
+    return audio_cache_stats()
+
+# Marks a prompt prefix for Anthropic's prompt cache
+EPHEMERAL_CACHE = {"type": "ephemeral"}
 
-    client = Anthropic(api_key=anthropic_key)
 
-    # Get curriculum for this level
-    from curriculum import get_level
+@lru_cache(maxsize=256)
+def build_lesson_context(student_level, lesson_number: int):
+    """System prompt and current lesson for a curriculum level, shared by chat and the conversation socket."""
     level_data = get_level(int(student_level))
 
     if not level_data:
@@ -249,61 +328,33 @@ async def chat(
 
     # Build lesson context
     level_name = level_data.get('name', 'Fundamentos de IA')
-    modules = level_data.get('modules', [])
     learning_objectives = level_data.get('learning_objectives', [])
 
     # Get specific lesson content
-    all_lessons = []
-    for module in modules:
-        for lesson in module.get('lessons', []):
-            all_lessons.append({
-                'module': module['title'],
-                'lesson': lesson
-            })
+    all_lessons = get_flat_lessons(level_data['level'])
 
     current_lesson_index = min(lesson_number - 1, len(all_lessons) - 1)
-    current_lesson = all_lessons[current_lesson_index] if all_lessons else {'module': 'Introdução', 'lesson': 'Fundamentos de IA'}
-
-    # Professor Caio's personality and teaching style with STRUCTURED LESSON PLAN
-    system_prompt = """Você é o Professor Pedro, um tutor brasileiro de IA especializado em RESPONDER DÚVIDAS dos alunos.
-
-SEU PAPEL:
-Você é um TUTOR SOCRÁTICO, não um palestrante. Você RESPONDE às perguntas dos alunos de forma clara e didática.
-
-CONTEXTO DO CURRÍCULO:
-Nível: {level_name}
-Módulo: {module_name}
-Lição {lesson_num}: {lesson_name}
-
-Objetivos de aprendizagem deste nível:
-{objectives}
-
-INSTRUÇÕES IMPORTANTES:
-1. RESPONDA à pergunta do aluno de forma clara e concisa
-2. Use exemplos brasileiros concretos (Magazine Luiza, Nubank, iFood, Mercado Livre)
-3. Adapte a complexidade da resposta ao nível do aluno
-4. Se a pergunta está fora do escopo do currículo, responda mesmo assim mas conecte ao currículo
-5. Seja encorajador e motivador
-6. Mantenha respostas em 3-5 frases para facilitar a compreensão
-7. Termine perguntando se ficou claro ou se o aluno tem mais dúvidas
-
-FORMATO DA PRIMEIRA MENSAGEM (quando o aluno se apresenta):
-"Oi! Eu sou o Professor Pedro, seu tutor de IA. Estou aqui para responder suas dúvidas sobre {level_name}.
-
-Pode me perguntar qualquer coisa sobre Inteligência Artificial! Como posso te ajudar hoje?"
-
-FORMATO DAS RESPOSTAS:
-[RESPOSTA CLARA E DIRETA à pergunta]
-
-[EXEMPLO PRÁTICO brasileiro se relevante]
+    if all_lessons:
+        module_title, lesson = all_lessons[current_lesson_index]
+        current_lesson = {'module': module_title, 'lesson': lesson}
+    else:
+        current_lesson = {'module': 'Introdução', 'lesson': 'Fundamentos de IA'}
 
-Ficou claro? Tem mais alguma dúvida?""".format(
+    system_prompt = PROFESSOR_PEDRO_SYSTEM.format(
         level_name=level_name,
         module_name=current_lesson['module'],
         lesson_num=lesson_number,
         lesson_name=current_lesson['lesson'],
         objectives="\n".join(f"- {obj}" for obj in learning_objectives[:3])
     )
+    return system_prompt, current_lesson
+
+
+def tutor_request(system_prompt: str, conversation_history: list, message: str) -> dict:
+    """Claude request for one tutor turn, with the system prompt and prior turns marked for prompt caching."""
+    # The prompt is fixed for a lesson, so it and the history before this turn
+    # are an identical prefix on every message of the conversation
+    system = [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL_CACHE}]
 
     # Build conversation with history
     messages = []
@@ -312,29 +363,120 @@ Ficou claro? Tem mais alguma dúvida?""".format(
             "role": msg["role"],
             "content": msg["content"]
         })
+    if messages and isinstance(messages[-1]["content"], str):
+        messages[-1]["content"] = [{
+            "type": "text",
+            "text": messages[-1]["content"],
+            "cache_control": EPHEMERAL_CACHE
+        }]
 
     messages.append({
         "role": "user",
         "content": message
     })
 
-    response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",  # Using Sonnet 4.5
-        max_tokens=500,
-        system=system_prompt,
-        messages=messages
+    return {
+        "model": "claude-sonnet-4-5-20250929",  # Using Sonnet 4.5
+        "max_tokens": 500,
+        "system": system,
+        "messages": messages
+    }
+
+
+def log_tutor_cache(usage):
+    """Log how much of a tutor turn's prompt came from the prompt cache."""
+    logger.debug(
+        "Tutor turn cache: %s read, %s written",
+        usage.cache_read_input_tokens,
+        usage.cache_creation_input_tokens
     )
 
+
+async def ask_tutor(system_prompt: str, conversation_history: list, message: str):
+    """One complete Claude turn."""
+    await acquire_upstream(LLM_SEMAPHORE)
+    try:
+        response = await anthropic_client.beta.prompt_caching.messages.create(
+            **tutor_request(system_prompt, conversation_history, message)
+        )
+    finally:
+        LLM_SEMAPHORE.release()
+
+    log_tutor_cache(response.usage)
+    return response
+
+
+async def stream_tutor(system_prompt: str, conversation_history: list, message: str):
+    """Yield a Claude turn's text as it is generated; the caller holds an LLM_SEMAPHORE slot."""
+    request = tutor_request(system_prompt, conversation_history, message)
+    async with anthropic_client.beta.prompt_caching.messages.stream(**request) as stream:
+        async for text in stream.text_stream:
+            yield text
+        log_tutor_cache((await stream.get_final_message()).usage)
+
+
+def sse_event(event: str, payload: dict) -> bytes:
+    """Encode one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: ".encode() + orjson.dumps(payload) + b"\n\n"
+
+# Claude conversational tutor endpoint
+@app.post("/api/tutoring/chat")
+async def chat(body: ChatRequest):
+    """Chat with Professor Caio - Conversational AI tutor with personality."""
+    message, conversation_history = body.message, body.conversation_history
+    student_level, lesson_number = body.student_level, body.lesson_number
+
+    if anthropic_client is None:
+        return {"error": "Anthropic API key not configured"}
+
+    system_prompt, _ = build_lesson_context(student_level, lesson_number)
+
+    if body.stream:
+        return StreamingResponse(
+            stream_chat(system_prompt, conversation_history, message),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+
+    response = await ask_tutor(system_prompt, conversation_history, message)
+
     return {
         "response": response.content[0].text,
         "model": "claude-3-5-sonnet-20241022"
     }
 
+
+async def stream_chat(system_prompt: str, conversation_history: list, message: str):
+    """SSE body for /api/tutoring/chat: delta events, then one end event with the full reply."""
+    try:
+        await acquire_upstream(LLM_SEMAPHORE)
+    except HTTPException as e:
+        yield sse_event("error", {"error": e.detail})
+        return
+    try:
+        parts = []
+        async for text in stream_tutor(system_prompt, conversation_history, message):
+            parts.append(text)
+            yield sse_event("delta", {"text": text})
+        yield sse_event("end", {"response": "".join(parts), "model": "claude-3-5-sonnet-20241022"})
+    finally:
+        LLM_SEMAPHORE.release()
+
+# The curriculum is constant, so serialise and compress it once
+CURRICULUM_BODY = orjson.dumps(get_curriculum(), default=dict)
+CURRICULUM_GZ = gzip.compress(CURRICULUM_BODY)
+
 # Curriculum endpoints
 @app.get("/api/curriculum")
-async def get_full_curriculum():
+async def get_full_curriculum(request: Request):
     """Get complete 18-month curriculum structure"""
-    return get_curriculum()
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(
+            content=CURRICULUM_GZ,
+            media_type="application/json",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
+    return Response(content=CURRICULUM_BODY, media_type="application/json", headers={"Vary": "Accept-Encoding"})
 
 @app.get("/api/curriculum/level/{level_number}")
 async def get_curriculum_level(level_number: int):
@@ -349,6 +491,9 @@ async def get_assessment():
     """Get placement test structure"""
     return get_placement_test()
 
+# Level each placement band (curriculum PLACEMENT_UPPER_BOUNDS) starts at
+PLACEMENT_LEVELS = (0, 1, 3, 4, 6, 7)
+
 @app.post("/api/assessment/evaluate")
 async def evaluate_placement(
     answers: dict = Body(..., embed=True)
@@ -367,18 +512,7 @@ async def evaluate_placement(
     percentage = (score / total) * 100 if total > 0 else 0
 
     # Determine level based on score
-    if percentage <= 30:
-        level = 0
-    elif percentage <= 45:
-        level = 1
-    elif percentage <= 60:
-        level = 3
-    elif percentage <= 75:
-        level = 4
-    elif percentage <= 85:
-        level = 6
-    else:
-        level = 7
+    level = PLACEMENT_LEVELS[bisect.bisect_left(PLACEMENT_UPPER_BOUNDS, percentage)]
 
     recommended_level = get_level(level)
 
@@ -387,6 +521,7 @@ async def evaluate_placement(
         "total": total,
         "percentage": round(percentage, 1),
         "recommended_level": level,
+        "placement_band": score_to_level(percentage),
         "level_details": recommended_level
     }
 
@@ -396,9 +531,7 @@ async def websocket_conversation(websocket: WebSocket):
     """Real-time conversational tutoring with streaming audio."""
     await websocket.accept()
 
-    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-
-    if not anthropic_key:
+    if anthropic_client is None:
         await websocket.send_json({"error": "Anthropic API key not configured"})
         await websocket.close()
         return
@@ -419,144 +552,45 @@ async def websocket_conversation(websocket: WebSocket):
                 voice_id = data.get("voice_id", "J7NSF1cIlVrVyE8KOute")
 
                 # 1. Generate AI response with Claude
-                from anthropic import Anthropic
-                client = Anthropic(api_key=anthropic_key)
-
                 # Get curriculum context (same as existing chat endpoint)
-                from curriculum import get_level
-                level_data = get_level(int(student_level))
-                if not level_data:
-                    level_data = get_level(0)
-
-                level_name = level_data.get('name', 'Fundamentos de IA')
-                modules = level_data.get('modules', [])
-                learning_objectives = level_data.get('learning_objectives', [])
-
-                all_lessons = []
-                for module in modules:
-                    for lesson in module.get('lessons', []):
-                        all_lessons.append({
-                            'module': module['title'],
-                            'lesson': lesson
-                        })
-
-                current_lesson_index = min(lesson_number - 1, len(all_lessons) - 1)
-                current_lesson = all_lessons[current_lesson_index] if all_lessons else {
-                    'module': 'Introdução',
-                    'lesson': 'Fundamentos de IA'
-                }
-
-                system_prompt = """Você é o Professor Pedro, um tutor brasileiro de IA especializado em RESPONDER DÚVIDAS dos alunos.
-
-SEU PAPEL:
-Você é um TUTOR SOCRÁTICO, não um palestrante. Você RESPONDE às perguntas dos alunos de forma clara e didática.
-
-CONTEXTO DO CURRÍCULO:
-Nível: {level_name}
-Módulo: {module_name}
-Lição {lesson_num}: {lesson_name}
-
-Objetivos de aprendizagem deste nível:
-{objectives}
-
-INSTRUÇÕES IMPORTANTES:
-1. RESPONDA à pergunta do aluno de forma clara e concisa
-2. Use exemplos brasileiros concretos (Magazine Luiza, Nubank, iFood, Mercado Livre)
-3. Adapte a complexidade da resposta ao nível do aluno
-4. Se a pergunta está fora do escopo do currículo, responda mesmo assim mas conecte ao currículo
-5. Seja encorajador e motivador
-6. Mantenha respostas em 3-5 frases para facilitar a compreensão
-7. Termine perguntando se ficou claro ou se o aluno tem mais dúvidas
-
-FORMATO DA PRIMEIRA MENSAGEM (quando o aluno se apresenta):
-"Oi! Eu sou o Professor Pedro, seu tutor de IA. Estou aqui para responder suas dúvidas sobre {level_name}.
-
-Pode me perguntar qualquer coisa sobre Inteligência Artificial! Como posso te ajudar hoje?"
+                system_prompt, current_lesson = build_lesson_context(student_level, lesson_number)
 
-FORMATO DAS RESPOSTAS:
-[RESPOSTA CLARA E DIRETA à pergunta]
-
-[EXEMPLO PRÁTICO brasileiro se relevante]
-
-Ficou claro? Tem mais alguma dúvida?""".format(
-                    level_name=level_name,
-                    module_name=current_lesson['module'],
-                    lesson_num=lesson_number,
-                    lesson_name=current_lesson['lesson'],
-                    objectives="\n".join(f"- {obj}" for obj in learning_objectives[:3])
-                )
-
-                # Build messages
-                messages = []
-                for msg in conversation_history:
-                    messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
-
-                messages.append({
-                    "role": "user",
-                    "content": message
-                })
+                # Stream the reply as it is generated so TTS can start on the first words
+                parts = []
+                try:
+                    await acquire_upstream(LLM_SEMAPHORE)
+                except HTTPException as e:
+                    # A busy moment shouldn't end the session; the client can resend
+                    await websocket.send_json({"type": "error", "message": e.detail})
+                    continue
+                try:
+                    async for text in stream_tutor(system_prompt, conversation_history, message):
+                        parts.append(text)
+                        await websocket.send_json({
+                            "type": "transcript_delta",
+                            "text": text
+                        })
+                finally:
+                    LLM_SEMAPHORE.release()
 
-                # Generate response
-                response = client.messages.create(
-                    model="claude-sonnet-4-5-20250929",  # Using Sonnet 4.5
-                    max_tokens=500,
-                    system=system_prompt,
-                    messages=messages
-                )
+                assistant_text = "".join(parts)
 
-                # Store student question for analytics
-                try:
-                    from datetime import datetime
-                    import sqlite3
-
-                    conn = sqlite3.connect('tutoria_analytics.db')
-                    cursor = conn.cursor()
-
-                    # Create table if it doesn't exist
-                    cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS student_questions (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            timestamp TEXT NOT NULL,
-                            student_level TEXT,
-                            lesson_number INTEGER,
-                            question TEXT NOT NULL,
-                            response TEXT NOT NULL,
-                            module TEXT,
-                            lesson_name TEXT
-                        )
-                    ''')
-
-                    # Insert question and response
-                    cursor.execute('''
-                        INSERT INTO student_questions
-                        (timestamp, student_level, lesson_number, question, response, module, lesson_name)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        datetime.now().isoformat(),
-                        student_level,
-                        lesson_number,
-                        message,
-                        response.content[0].text,
-                        current_lesson['module'],
-                        current_lesson['lesson']
-                    ))
-
-                    conn.commit()
-                    conn.close()
-                except Exception as e:
-                    print(f"Error storing question: {e}")
-
-                assistant_text = response.content[0].text
-
-                # Send transcript to frontend (HeyGen will handle TTS)
+                # Full transcript also marks the end of the reply (HeyGen will handle TTS)
                 await websocket.send_json({
                     "type": "transcript",
                     "text": assistant_text
                 })
 
+                # Store student question for analytics, after the reply is on its way
+                record_question(
+                    student_level,
+                    lesson_number,
+                    message,
+                    assistant_text,
+                    current_lesson['module'],
+                    current_lesson['lesson']
+                )
+
                 # Audio generation is now handled by HeyGen on the frontend
                 # No need for ElevenLabs streaming
 
@@ -575,4 +609,14 @@ Ficou claro? Tem mais alguma dúvida?""".format(
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
+    # Audio frames are already compressed; don't deflate them per connection.
+    # Multiple workers need the import string rather than the app object.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8000)),
+        workers=int(os.getenv("WEB_CONCURRENCY", 2)),
+        loop="uvloop",
+        http="httptools",
+        ws_per_message_deflate=False,
+    )
@@ -6,6 +6,8 @@ import logging
 from config import settings
 # from api import auth, students, lessons, tutoring, progress, webhooks
 from utils.database import init_db, close_db
+from services.interaction_writer import start_interaction_writer, stop_interaction_writer
+from utils.http import close_http_client
 
 
 # Configure logging
@@ -34,9 +36,12 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up AI Tutor Platform API...")
     await init_db()
+    start_interaction_writer()
     yield
     # Shutdown
     logger.info("Shutting down AI Tutor Platform API...")
+    await stop_interaction_writer()
+    await close_http_client()
     await close_db()
 
 
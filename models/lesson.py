@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, JSON, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, JSON, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from utils.database import Base
@@ -8,15 +8,19 @@ import uuid
 
 class Lesson(Base):
     __tablename__ = "lessons"
+    __table_args__ = (
+        # Per-student status/time filters (conflict check, upcoming, history)
+        Index("ix_lessons_student_status_start", "student_id", "status", "scheduled_start"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     student_id = Column(UUID(as_uuid=True), ForeignKey("students.id"), nullable=False)
 
     # Scheduling
-    scheduled_start = Column(DateTime, nullable=False, index=True)
-    scheduled_end = Column(DateTime, nullable=False)
-    actual_start = Column(DateTime)
-    actual_end = Column(DateTime)
+    scheduled_start = Column(DateTime(timezone=True), nullable=False, index=True)
+    scheduled_end = Column(DateTime(timezone=True), nullable=False)
+    actual_start = Column(DateTime(timezone=True))
+    actual_end = Column(DateTime(timezone=True))
     duration_minutes = Column(Integer)
 
     # Lesson details
@@ -64,7 +68,7 @@ class Lesson(Base):
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    canceled_at = Column(DateTime)
+    canceled_at = Column(DateTime(timezone=True))
     cancellation_reason = Column(String(255))
 
     # Relationships
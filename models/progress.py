@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, JSON, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, JSON, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from utils.database import Base
@@ -8,6 +8,10 @@ import uuid
 
 class Progress(Base):
     __tablename__ = "progress"
+    __table_args__ = (
+        # Latest assessment per student is a backward scan of this index
+        Index("ix_progress_student_assessment_date", "student_id", "assessment_date"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     student_id = Column(UUID(as_uuid=True), ForeignKey("students.id"), nullable=False)
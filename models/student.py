@@ -35,7 +35,7 @@ class Student(Base):
     total_minutes_studied = Column(Integer, default=0)
     current_streak_days = Column(Integer, default=0)
     longest_streak_days = Column(Integer, default=0)
-    last_active_date = Column(DateTime)
+    last_active_date = Column(DateTime(timezone=True))
     placement_test_score = Column(Float)
     placement_test_completed = Column(Boolean, default=False)
 
@@ -4,13 +4,16 @@ Voice generation endpoints using ElevenLabs
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-import aiohttp
 import os
 from fastapi.responses import StreamingResponse
 import io
+from utils.http import get_http_client
 
 router = APIRouter()
 
+# ElevenLabs synthesis can take a while for longer texts
+VOICE_TIMEOUT = 30.0
+
 
 class VoiceGenerationRequest(BaseModel):
     text: str
@@ -42,23 +45,20 @@ async def generate_voice(request: VoiceGenerationRequest):
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data) as response:
-                if response.status == 200:
-                    audio_data = await response.read()
-                    return StreamingResponse(
-                        io.BytesIO(audio_data),
-                        media_type="audio/mpeg",
-                        headers={
-                            "Content-Disposition": "inline; filename=speech.mp3"
-                        }
-                    )
-                else:
-                    error_text = await response.text()
-                    raise HTTPException(
-                        status_code=response.status,
-                        detail=f"ElevenLabs API error: {error_text}"
-                    )
+        response = await get_http_client().post(url, headers=headers, json=data, timeout=VOICE_TIMEOUT)
+        if response.status_code == 200:
+            return StreamingResponse(
+                io.BytesIO(response.content),
+                media_type="audio/mpeg",
+                headers={
+                    "Content-Disposition": "inline; filename=speech.mp3"
+                }
+            )
+        else:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"ElevenLabs API error: {response.text}"
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -75,25 +75,24 @@ async def get_available_voices():
     headers = {"xi-api-key": api_key}
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        "voices": [
-                            {
-                                "voice_id": voice.get("voice_id"),
-                                "name": voice.get("name"),
-                                "preview_url": voice.get("preview_url"),
-                                "category": voice.get("category", "unknown")
-                            }
-                            for voice in data.get("voices", [])
-                        ]
+        response = await get_http_client().get(url, headers=headers, timeout=VOICE_TIMEOUT)
+        if response.status_code == 200:
+            data = response.json()
+            return {
+                "voices": [
+                    {
+                        "voice_id": voice.get("voice_id"),
+                        "name": voice.get("name"),
+                        "preview_url": voice.get("preview_url"),
+                        "category": voice.get("category", "unknown")
                     }
-                else:
-                    raise HTTPException(
-                        status_code=response.status,
-                        detail="Failed to fetch voices"
-                    )
+                    for voice in data.get("voices", [])
+                ]
+            }
+        else:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail="Failed to fetch voices"
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -18,12 +18,21 @@ CREATE TABLE IF NOT EXISTS user_progress (
     current_level INTEGER DEFAULT 0,
     current_module INTEGER DEFAULT 0,
     current_lesson INTEGER DEFAULT 1,
-    completed_lessons JSONB DEFAULT '[]',
     total_lessons_completed INTEGER DEFAULT 0,
     updated_at TIMESTAMP DEFAULT NOW(),
     UNIQUE(user_id)
 );
 
+-- Lessons each user has finished (one row per lesson)
+CREATE TABLE IF NOT EXISTS completed_lessons (
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    level INTEGER NOT NULL,
+    module INTEGER NOT NULL,
+    lesson INTEGER NOT NULL,
+    completed_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (user_id, level, module, lesson)
+);
+
 -- Conversation history
 CREATE TABLE IF NOT EXISTS conversations (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -68,15 +77,17 @@ CREATE TABLE IF NOT EXISTS learning_streaks (
     UNIQUE(user_id)
 );
 
+-- Databases created from the SQLAlchemy models before JSONB was used
+ALTER TABLE conversations ALTER COLUMN messages TYPE jsonb USING messages::jsonb;
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_users_clerk_id ON users(clerk_id);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_user_progress_user_id ON user_progress(user_id);
-CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
+CREATE INDEX IF NOT EXISTS ix_conv_user_created ON conversations(user_id, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON conversations(created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_student_questions_user_id ON student_questions(user_id);
+CREATE INDEX IF NOT EXISTS ix_questions_user_timestamp ON student_questions(user_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_student_questions_timestamp ON student_questions(timestamp DESC);
-CREATE INDEX IF NOT EXISTS idx_achievements_user_id ON achievements(user_id);
 CREATE INDEX IF NOT EXISTS idx_streaks_user_id ON learning_streaks(user_id);
 
 -- Functions for automatic timestamp updates
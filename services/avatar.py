@@ -1,13 +1,16 @@
-import aiohttp
 import asyncio
 import json
 import logging
 from typing import Optional, Dict, Any, List
 from config import settings
+from utils.http import get_http_client
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Video requests take longer than the shared client's default timeout allows
+AVATAR_TIMEOUT = 30.0
+
 
 class HeyGenAvatarService:
     """Service for creating AI avatar videos with HeyGen API."""
@@ -60,19 +63,18 @@ class HeyGenAvatarService:
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=data) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return {
-                            "video_id": result.get("video_id"),
-                            "status": "processing",
-                            "estimated_time": result.get("estimated_time", 120)
-                        }
-                    else:
-                        error = await response.text()
-                        logger.error(f"HeyGen API error: {error}")
-                        raise Exception(f"Failed to create avatar video: {error}")
+            response = await get_http_client().post(url, headers=headers, json=data, timeout=AVATAR_TIMEOUT)
+            if response.status_code == 200:
+                result = response.json()
+                return {
+                    "video_id": result.get("video_id"),
+                    "status": "processing",
+                    "estimated_time": result.get("estimated_time", 120)
+                }
+            else:
+                error = response.text
+                logger.error(f"HeyGen API error: {error}")
+                raise Exception(f"Failed to create avatar video: {error}")
         except Exception as e:
             logger.error(f"Error creating avatar video: {e}")
             raise
@@ -89,20 +91,19 @@ class HeyGenAvatarService:
             "video_id": video_id
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return {
-                        "status": result.get("status"),
-                        "video_url": result.get("video_url"),
-                        "thumbnail_url": result.get("thumbnail_url"),
-                        "duration": result.get("duration")
-                    }
-                else:
-                    error = await response.text()
-                    logger.error(f"Failed to get video status: {error}")
-                    raise Exception(f"Failed to get video status: {error}")
+        response = await get_http_client().get(url, headers=headers, params=params)
+        if response.status_code == 200:
+            result = response.json()
+            return {
+                "status": result.get("status"),
+                "video_url": result.get("video_url"),
+                "thumbnail_url": result.get("thumbnail_url"),
+                "duration": result.get("duration")
+            }
+        else:
+            error = response.text
+            logger.error(f"Failed to get video status: {error}")
+            raise Exception(f"Failed to get video status: {error}")
 
     async def create_interactive_avatar_session(
         self,
@@ -144,14 +145,13 @@ class HeyGenAvatarService:
             "gesture": "auto"  # Automatic gestures based on text
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error = await response.text()
-                    logger.error(f"Failed to send avatar response: {error}")
-                    raise Exception(f"Failed to send avatar response: {error}")
+        response = await get_http_client().post(url, headers=headers, json=data, timeout=AVATAR_TIMEOUT)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            error = response.text
+            logger.error(f"Failed to send avatar response: {error}")
+            raise Exception(f"Failed to send avatar response: {error}")
 
     async def create_lesson_intro(
         self,
@@ -1,18 +1,92 @@
 import anthropic
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 import json
+import re
 import logging
 from config import settings
 from datetime import datetime
+from functools import lru_cache
+from utils.http import get_http_client
 
 logger = logging.getLogger(__name__)
 
+# Prompt-caching breakpoint for the parts of a lesson request that repeat every turn
+EPHEMERAL_CACHE = {"type": "ephemeral"}
+
+# Conversation history is windowed in steps of this many messages
+HISTORY_WINDOW_STEP = 10
+
+# Where a streamed reply can be cut into sentences for speech
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+# Forced tool call for assessments, so the model returns a compact JSON payload
+ASSESSMENT_TOOL = {
+    "name": "record_assessment",
+    "description": "Record the assessment of a student's English response.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "grammar_errors": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "error": {"type": "string"},
+                        "correction": {"type": "string"}
+                    },
+                    "required": ["error", "correction"]
+                }
+            },
+            "vocabulary": {"type": "array", "items": {"type": "string"}},
+            "pronunciation_issues": {"type": "array", "items": {"type": "string"}},
+            "fluency_score": {"type": "integer", "minimum": 0, "maximum": 100},
+            "overall_score": {"type": "integer", "minimum": 0, "maximum": 100},
+            "strengths": {"type": "array", "items": {"type": "string"}},
+            "weaknesses": {"type": "array", "items": {"type": "string"}},
+            "recommendations": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": [
+            "grammar_errors", "overall_score", "strengths", "weaknesses", "recommendations"
+        ]
+    }
+}
+
+# Forced tool call for grammar practice, so one request returns the whole set
+GRAMMAR_EXERCISES_TOOL = {
+    "name": "emit_exercises",
+    "description": "Return the grammar exercises.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "exercises": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "type": {"type": "string", "enum": ["fill_blank", "correction", "transformation"]},
+                        "question": {"type": "string"},
+                        "answer": {"type": "string"},
+                        "explanation": {"type": "string"}
+                    },
+                    "required": ["type", "question", "answer", "explanation"]
+                }
+            }
+        },
+        "required": ["exercises"]
+    }
+}
+
 
 class ClaudeTutor:
     """Core AI tutoring logic using Claude."""
 
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        # Reuse the process-wide connection pool; keep the SDK's own request timeout
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            http_client=get_http_client(),
+            timeout=anthropic.DEFAULT_TIMEOUT
+        )
         self.model = settings.CLAUDE_MODEL
 
     async def conduct_lesson(
@@ -20,24 +94,53 @@ class ClaudeTutor:
         student_profile: Dict[str, Any],
         lesson_plan: Dict[str, Any],
         conversation_history: List[Dict[str, str]],
-        user_message: str
+        user_message: str,
+        on_sentence: Optional[Callable[[str], None]] = None
     ) -> Dict[str, Any]:
-        """Conduct a tutoring session interaction."""
+        """Conduct a tutoring session interaction.
+
+        If on_sentence is given, the reply is streamed and each sentence is
+        passed to it as soon as it is complete.
+        """
         try:
-            # Build context
+            # Build context; it is fixed for the lesson, so cache it
             system_prompt = self._build_system_prompt(student_profile, lesson_plan)
+            system = [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL_CACHE}]
 
-            # Format conversation history
+            # Format conversation history, caching everything up to the last turn
             messages = self._format_conversation(conversation_history)
+            if messages:
+                messages[-1]["content"] = [{
+                    "type": "text",
+                    "text": messages[-1]["content"],
+                    "cache_control": EPHEMERAL_CACHE
+                }]
             messages.append({"role": "user", "content": user_message})
 
             # Get response from Claude
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=settings.MAX_TOKENS,
-                temperature=settings.TEMPERATURE,
-                system=system_prompt,
-                messages=messages
+            request = {
+                "model": self.model,
+                "max_tokens": settings.MAX_TOKENS,
+                "temperature": settings.TEMPERATURE,
+                "system": system,
+                "messages": messages
+            }
+            if on_sentence is None:
+                response = await self.client.beta.prompt_caching.messages.create(**request)
+            else:
+                async with self.client.beta.prompt_caching.messages.stream(**request) as stream:
+                    pending = ""
+                    async for text in stream.text_stream:
+                        *sentences, pending = SENTENCE_BREAK.split(pending + text)
+                        for sentence in sentences:
+                            on_sentence(sentence)
+                    if pending.strip():
+                        on_sentence(pending.strip())
+                    response = await stream.get_final_message()
+            logger.debug(
+                "Lesson turn cache: %s read, %s written",
+                response.usage.cache_read_input_tokens,
+                response.usage.cache_creation_input_tokens
             )
 
             # Parse response and extract teaching elements
@@ -49,7 +152,9 @@ class ClaudeTutor:
                 "analysis": analysis,
                 "usage": {
                     "input_tokens": response.usage.input_tokens,
-                    "output_tokens": response.usage.output_tokens
+                    "output_tokens": response.usage.output_tokens,
+                    "cache_read_input_tokens": response.usage.cache_read_input_tokens,
+                    "cache_creation_input_tokens": response.usage.cache_creation_input_tokens
                 }
             }
 
@@ -89,7 +194,7 @@ Provide a structured JSON response with:
 9. success_criteria - How to measure success
 """
 
-        response = self.client.messages.create(
+        response = await self.client.messages.create(
             model=self.model,
             max_tokens=2048,
             temperature=0.7,
@@ -111,25 +216,47 @@ Provide a structured JSON response with:
 Student Response: "{student_message}"
 {f'Expected/Model Response: "{expected_response}"' if expected_response else ''}
 
-Provide detailed assessment including:
-1. Grammar errors (with corrections)
-2. Vocabulary usage (appropriateness and alternatives)
-3. Pronunciation issues (if detectable from spelling)
-4. Fluency and coherence
-5. Overall score (0-100)
-6. Specific feedback for improvement
-7. Positive reinforcement
-
-Return as structured JSON."""
+Assess grammar errors (with corrections), vocabulary usage, pronunciation issues
+(if detectable from spelling), fluency and an overall score (0-100), plus strengths,
+weaknesses and recommendations for improvement. Keep each item short.
+Record the result with the record_assessment tool."""
 
-        response = self.client.messages.create(
+        response = await self.client.messages.create(
             model=self.model,
             max_tokens=1024,
             temperature=0.3,
+            tools=[ASSESSMENT_TOOL],
+            tool_choice={"type": "tool", "name": ASSESSMENT_TOOL["name"]},
             messages=[{"role": "user", "content": prompt}]
         )
 
-        return json.loads(response.content[0].text)
+        # The forced tool call's input is already a parsed dict
+        return next(block.input for block in response.content if block.type == "tool_use")
+
+    async def generate_grammar_exercises(
+        self,
+        grammar_point: str,
+        student_level: Optional[str],
+        num_exercises: int
+    ) -> List[Dict[str, str]]:
+        """Generate a set of grammar exercises in a single request."""
+        prompt = f"""Create {num_exercises} grammar exercises for: {grammar_point}
+Student Level: {student_level}
+Exercise types: varied (fill-in-blank, correction, transformation)
+Include the answer and a short explanation for each.
+Return them with the emit_exercises tool."""
+
+        response = await self.client.messages.create(
+            model=self.model,
+            max_tokens=256 * num_exercises,
+            temperature=0.7,
+            tools=[GRAMMAR_EXERCISES_TOOL],
+            tool_choice={"type": "tool", "name": GRAMMAR_EXERCISES_TOOL["name"]},
+            messages=[{"role": "user", "content": prompt}]
+        )
+
+        tool_input = next(block.input for block in response.content if block.type == "tool_use")
+        return tool_input["exercises"]
 
     async def generate_follow_up_questions(
         self,
@@ -146,7 +273,7 @@ Student Strengths: {student_performance.get('strengths')}
 
 Questions should be progressively challenging and engaging."""
 
-        response = self.client.messages.create(
+        response = await self.client.messages.create(
             model=self.model,
             max_tokens=512,
             temperature=0.8,
@@ -174,7 +301,7 @@ Provide:
 5. Difficulty level
 6. Skill being tested"""
 
-        response = self.client.messages.create(
+        response = await self.client.messages.create(
             model=self.model,
             max_tokens=512,
             temperature=0.6,
@@ -223,8 +350,17 @@ Remember to maintain a conversational, friendly tone while being educational."""
         history: List[Dict[str, str]]
     ) -> List[Dict[str, str]]:
         """Format conversation history for Claude API."""
+        # Keep the last 10-19 messages, dropping old ones ten at a time so the
+        # prompt prefix stays stable (and cached) between turns
+        window = history[self._history_excess(history):]
+
+        # Unusually long messages: drop the oldest exchanges until the window
+        # fits the budget (roughly four characters per token)
+        while len(window) > 2 and sum(len(msg.get("content", "")) for msg in window) // 4 > settings.MAX_HISTORY_TOKENS:
+            window = window[2:]
+
         formatted = []
-        for msg in history[-10:]:  # Keep last 10 messages for context
+        for msg in window:
             role = "assistant" if msg.get("role") == "ai" else "user"
             formatted.append({
                 "role": role,
@@ -232,6 +368,15 @@ Remember to maintain a conversational, friendly tone while being educational."""
             })
         return formatted
 
+    def prune_history(self, history: List[Dict[str, str]]):
+        """Drop messages in place that can no longer be part of the prompt window."""
+        del history[:self._history_excess(history)]
+
+    @staticmethod
+    def _history_excess(history: List[Dict[str, str]]) -> int:
+        """Number of oldest messages that fall outside the prompt window."""
+        return max(0, (len(history) - HISTORY_WINDOW_STEP) // HISTORY_WINDOW_STEP * HISTORY_WINDOW_STEP)
+
     def _analyze_response(
         self,
         ai_response: str,
@@ -298,4 +443,10 @@ Remember to maintain a conversational, friendly tone while being educational."""
                     questions.append(question)
 
         # Ensure we have 5 questions
-        return questions[:5] if len(questions) >= 5 else questions
\ No newline at end of file
+        return questions[:5] if len(questions) >= 5 else questions
+
+
+@lru_cache()
+def get_claude_tutor() -> ClaudeTutor:
+    """Get the shared tutor, creating it on first use."""
+    return ClaudeTutor()
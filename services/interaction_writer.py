@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import List, Optional
+from models.interaction import Interaction
+from utils.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+INTERACTION_QUEUE_SIZE = 10_000
+INTERACTION_BATCH_SIZE = 100
+
+_queue: Optional[asyncio.Queue] = None
+_worker: Optional[asyncio.Task] = None
+
+
+def start_interaction_writer():
+    """Start the background task that saves queued interactions."""
+    global _queue, _worker
+    if _worker is None:
+        _queue = asyncio.Queue(maxsize=INTERACTION_QUEUE_SIZE)
+        _worker = asyncio.create_task(_write_batches())
+
+
+def record_interaction(interaction: Interaction):
+    """Queue an interaction to be inserted off the request path."""
+    start_interaction_writer()
+    try:
+        _queue.put_nowait(interaction)
+    except asyncio.QueueFull:
+        logger.warning(f"Interaction queue full, dropping interaction for lesson {interaction.lesson_id}")
+
+
+async def stop_interaction_writer():
+    """Save whatever is still queued and stop the writer."""
+    global _queue, _worker
+    if _worker is None:
+        return
+    await _queue.put(None)
+    await _worker
+    _queue = None
+    _worker = None
+
+
+async def _write_batches():
+    while True:
+        item = await _queue.get()
+        stopping = item is None
+        rows: List[Interaction] = [] if stopping else [item]
+
+        # Take whatever else is already waiting, up to one batch
+        while not stopping and len(rows) < INTERACTION_BATCH_SIZE and not _queue.empty():
+            item = _queue.get_nowait()
+            if item is None:
+                stopping = True
+            else:
+                rows.append(item)
+
+        if rows:
+            try:
+                async with AsyncSessionLocal() as session:
+                    session.add_all(rows)
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Failed to save {len(rows)} interactions: {e}")
+
+        if stopping:
+            return
@@ -4,10 +4,14 @@ import json
 import logging
 from typing import Optional, Dict, Any, AsyncGenerator
 from config import settings
+from utils.http import get_http_client
 import base64
 
 logger = logging.getLogger(__name__)
 
+# Synthesis takes longer than the shared client's default timeout allows
+VOICE_TIMEOUT = 30.0
+
 
 class ElevenLabsVoiceService:
     """Real-time voice service using ElevenLabs API."""
@@ -45,14 +49,13 @@ class ElevenLabsVoiceService:
             }
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data) as response:
-                if response.status == 200:
-                    return await response.read()
-                else:
-                    error = await response.text()
-                    logger.error(f"ElevenLabs TTS error: {error}")
-                    raise Exception(f"TTS failed: {error}")
+        response = await get_http_client().post(url, headers=headers, json=data, timeout=VOICE_TIMEOUT)
+        if response.status_code == 200:
+            return response.content
+        else:
+            error = response.text
+            logger.error(f"ElevenLabs TTS error: {error}")
+            raise Exception(f"TTS failed: {error}")
 
     async def text_to_speech_stream(
         self,
@@ -78,15 +81,16 @@ class ElevenLabsVoiceService:
             }
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data) as response:
-                if response.status == 200:
-                    async for chunk in response.content.iter_chunked(1024):
-                        yield chunk
-                else:
-                    error = await response.text()
-                    logger.error(f"ElevenLabs streaming error: {error}")
-                    raise Exception(f"Streaming failed: {error}")
+        async with get_http_client().stream(
+            "POST", url, headers=headers, json=data, timeout=VOICE_TIMEOUT
+        ) as response:
+            if response.status_code == 200:
+                async for chunk in response.aiter_bytes(1024):
+                    yield chunk
+            else:
+                error = (await response.aread()).decode(errors="replace")
+                logger.error(f"ElevenLabs streaming error: {error}")
+                raise Exception(f"Streaming failed: {error}")
 
     async def websocket_stream(
         self,
@@ -159,28 +163,26 @@ class ElevenLabsVoiceService:
         url = f"{self.base_url}/voices"
         headers = {"xi-api-key": self.api_key}
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error = await response.text()
-                    logger.error(f"Failed to get voices: {error}")
-                    raise Exception(f"Failed to get voices: {error}")
+        response = await get_http_client().get(url, headers=headers)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            error = response.text
+            logger.error(f"Failed to get voices: {error}")
+            raise Exception(f"Failed to get voices: {error}")
 
     async def get_voice_settings(self, voice_id: str) -> Dict[str, Any]:
         """Get voice settings."""
         url = f"{self.base_url}/voices/{voice_id}/settings"
         headers = {"xi-api-key": self.api_key}
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error = await response.text()
-                    logger.error(f"Failed to get voice settings: {error}")
-                    raise Exception(f"Failed to get voice settings: {error}")
+        response = await get_http_client().get(url, headers=headers)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            error = response.text
+            logger.error(f"Failed to get voice settings: {error}")
+            raise Exception(f"Failed to get voice settings: {error}")
 
     async def create_pronunciation_assessment(
         self,
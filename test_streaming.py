@@ -0,0 +1,94 @@
+"""
+Test that /api/tutoring/chat SSE deltas reach the client while Claude is still generating
+"""
+import asyncio
+import json
+import httpx
+from anthropic import AsyncAnthropic
+import main
+
+# How long the fake Claude stream waits for the first delta to reach the client
+FIRST_DELTA_TIMEOUT = 2.0
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class SlowClaudeStream(httpx.AsyncByteStream):
+    """Claude stream that sends one delta, then holds the rest until the client has seen it."""
+
+    def __init__(self, first_delta_seen: asyncio.Event):
+        self.first_delta_seen = first_delta_seen
+        self.delivered_early = False
+
+    async def __aiter__(self):
+        yield sse("message_start", {"type": "message_start", "message": {
+            "id": "msg", "type": "message", "role": "assistant", "model": "test", "content": [],
+            "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": 1, "output_tokens": 0,
+                      "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        }})
+        yield sse("content_block_start", {"type": "content_block_start", "index": 0,
+                                          "content_block": {"type": "text", "text": ""}})
+        yield sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                          "delta": {"type": "text_delta", "text": "Oi"}})
+        try:
+            await asyncio.wait_for(self.first_delta_seen.wait(), FIRST_DELTA_TIMEOUT)
+            self.delivered_early = True
+        except asyncio.TimeoutError:
+            pass
+        yield sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                          "delta": {"type": "text_delta", "text": ", tudo bem?"}})
+        yield sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+        yield sse("message_delta", {"type": "message_delta",
+                                    "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                    "usage": {"output_tokens": 2}})
+        yield sse("message_stop", {"type": "message_stop"})
+
+
+async def test_streaming():
+    """Call the ASGI app directly so nothing between it and us buffers the body"""
+    first_delta_seen = asyncio.Event()
+    claude_stream = SlowClaudeStream(first_delta_seen)
+    main.anthropic_client = AsyncAnthropic(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, stream=claude_stream, headers={"content-type": "text/event-stream"})
+        ))
+    )
+
+    body = json.dumps({"message": "Oi", "stream": True}).encode()
+    received = [{"type": "http.request", "body": body, "more_body": False}]
+    headers = []
+
+    async def receive():
+        if received:
+            return received.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            headers.extend(message["headers"])
+        elif message["type"] == "http.response.body" and b"event: delta" in message.get("body", b""):
+            first_delta_seen.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/tutoring/chat", "raw_path": b"/api/tutoring/chat",
+        "query_string": b"", "root_path": "", "client": ("test", 1), "server": ("test", 80),
+        "headers": [(b"content-type", b"application/json"), (b"accept-encoding", b"gzip")],
+    }
+
+    print("📡 Testing SSE streaming of tutor replies...")
+    await main.app(scope, receive, send)
+
+    if claude_stream.delivered_early and (b"content-encoding", b"gzip") not in headers:
+        print("✅ First delta reached the client before Claude finished")
+        return True
+    print("❌ Deltas were held back until the end of the stream")
+    return False
+
+
+if __name__ == "__main__":
+    asyncio.run(test_streaming())
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+
+# Synthesised clips kept in memory; curriculum lines repeat, so a few hundred covers the hot set
+AUDIO_CACHE_SIZE = 256
+# Byte cap per worker; clips larger than this are served but never cached
+AUDIO_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_clips: "OrderedDict[str, bytes]" = OrderedDict()
+_total_bytes = 0
+_hits = 0
+_misses = 0
+
+
+def audio_cache_key(*parts) -> str:
+    """Hash everything that affects the synthesised audio into a cache key."""
+    return hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=16).hexdigest()
+
+
+def get_audio(key: str) -> Optional[bytes]:
+    """Return cached audio for key, marking it as recently used."""
+    global _hits, _misses
+    clip = _clips.get(key)
+    if clip is None:
+        _misses += 1
+        return None
+    _hits += 1
+    _clips.move_to_end(key)
+    return clip
+
+
+def put_audio(key: str, clip: bytes):
+    """Store audio, evicting least recently used clips until under both caps."""
+    global _total_bytes
+    if len(clip) > AUDIO_CACHE_MAX_BYTES:
+        return
+    old = _clips.pop(key, None)
+    if old is not None:
+        _total_bytes -= len(old)
+    _clips[key] = clip
+    _total_bytes += len(clip)
+    while len(_clips) > AUDIO_CACHE_SIZE or _total_bytes > AUDIO_CACHE_MAX_BYTES:
+        _, evicted = _clips.popitem(last=False)
+        _total_bytes -= len(evicted)
+
+
+def audio_cache_stats() -> dict:
+    """Hit/miss counters and current size of the audio cache."""
+    return {
+        "entries": len(_clips),
+        "max_entries": AUDIO_CACHE_SIZE,
+        "bytes": _total_bytes,
+        "max_bytes": AUDIO_CACHE_MAX_BYTES,
+        "hits": _hits,
+        "misses": _misses,
+    }
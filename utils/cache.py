@@ -0,0 +1,46 @@
+import redis.asyncio as redis
+import json
+import logging
+from typing import Any, Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Shared Redis client; the connection pool is created lazily on first command
+redis_client = redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    socket_connect_timeout=0.5,
+    socket_timeout=0.5,
+)
+
+
+async def cache_get(key: str) -> Optional[Any]:
+    """Get a JSON value from the cache, or None on miss or Redis failure."""
+    try:
+        value = await redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Cache get failed for {key}: {e}")
+        return None
+    return json.loads(value) if value is not None else None
+
+
+async def cache_set(key: str, value: Any, ttl: int):
+    """Store a JSON value in the cache with a TTL in seconds."""
+    try:
+        await redis_client.set(key, json.dumps(value), ex=ttl)
+    except redis.RedisError as e:
+        logger.warning(f"Cache set failed for {key}: {e}")
+
+
+async def cache_delete(key: str):
+    """Remove a key from the cache."""
+    try:
+        await redis_client.delete(key)
+    except redis.RedisError as e:
+        logger.warning(f"Cache delete failed for {key}: {e}")
+
+
+async def close_cache():
+    """Close the Redis connection pool."""
+    await redis_client.aclose()
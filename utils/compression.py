@@ -0,0 +1,29 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+# Streams that gzip would hold back (SSE deltas) or can't shrink (MP3)
+UNCOMPRESSED_MEDIA_TYPES = ("text/event-stream", "audio/mpeg")
+
+
+class SelectiveGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            await super().send_with_gzip(message)
+            # Reuse GZipResponder's pass-through path for already-encoded bodies
+            if content_type.startswith(UNCOMPRESSED_MEDIA_TYPES):
+                self.content_encoding_set = True
+            return
+        await super().send_with_gzip(message)
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that sends UNCOMPRESSED_MEDIA_TYPES through untouched, chunk by chunk."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = SelectiveGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.pool import NullPool
 from config import settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,18 +12,27 @@ logger = logging.getLogger(__name__)
 if settings.DATABASE_URL.startswith("sqlite"):
     # SQLite for local development
     database_url = settings.DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://")
-    connect_args = {"check_same_thread": False}
+    engine_options = {"connect_args": {"check_same_thread": False}}
 else:
-    # PostgreSQL for production
-    database_url = settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-    connect_args = {}
+    # PostgreSQL for production, through the pgbouncer URL when there is one
+    database_url = (settings.DATABASE_URL_POOLED or settings.DATABASE_URL).replace(
+        "postgresql://", "postgresql+asyncpg://"
+    )
+    engine_options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+    if settings.DATABASE_URL_POOLED:
+        # pgbouncer (transaction mode) can't keep server-side prepared statements
+        engine_options["connect_args"] = {"prepared_statement_cache_size": 0, "statement_cache_size": 0}
 
-# Create async engine
+# Create async engine (async engines pool with AsyncAdaptedQueuePool)
 engine = create_async_engine(
     database_url,
     echo=settings.DEBUG,
-    connect_args=connect_args if settings.DATABASE_URL.startswith("sqlite") else {},
-    pool_pre_ping=True if not settings.DATABASE_URL.startswith("sqlite") else False,
+    **engine_options,
 )
 
 # Create session factory
@@ -56,12 +66,21 @@ async def init_db():
             # Import all models to ensure they're registered
             from models import student, lesson, interaction, progress, curriculum
             await conn.run_sync(Base.metadata.create_all)
+        await warm_pool()
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
 
 
+async def warm_pool():
+    """Open the pool's base connections up front instead of on the first requests."""
+    if engine.dialect.name == "sqlite":
+        return
+    connections = await asyncio.gather(*(engine.connect() for _ in range(settings.DB_POOL_SIZE)))
+    await asyncio.gather(*(connection.close() for connection in connections))
+
+
 async def close_db():
     """Close database connection."""
     await engine.dispose()
@@ -0,0 +1,20 @@
+from fastapi import Request
+import hashlib
+
+# Clients must revalidate, but may keep the body and send If-None-Match
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(*parts) -> str:
+    """Build a quoted ETag from the values a response depends on."""
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match already matches the ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
@@ -0,0 +1,40 @@
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import logging
+import queue
+
+_listener: Optional[QueueListener] = None
+
+
+def start_log_listener() -> None:
+    """Route root log records through a queue so handler I/O runs off the event loop."""
+    global _listener
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    handlers = root.handlers[:] or [logging.StreamHandler()]
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_log_listener() -> None:
+    """Flush queued records and restore the original root handlers."""
+    global _listener
+    if _listener is None:
+        return
+
+    _listener.stop()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = None